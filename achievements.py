@@ -0,0 +1,47 @@
+import uuid
+
+from django.core.cache import cache
+
+from .models import RecentAchievement
+
+FEED_VERSION_KEY = 'trackapp:feed-version'
+
+FEED_SIZE = 20
+
+
+def feed_version():
+    """A token for cache keys that changes whenever stats are written."""
+    return cache.get_or_set(FEED_VERSION_KEY, lambda: uuid.uuid4().hex, None)
+
+
+def bump_feed_version():
+    cache.set(FEED_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def append_achievements(rows, stats):
+    """Add the personal bests and broken milestones in stats to the feed.
+
+    Results already in the feed for an award are left alone, so a result
+    only appears the first time it earns it.
+    """
+    RecentAchievement.objects.bulk_create([
+        RecentAchievement(
+            kind=kind,
+            result_id=row.id,
+            athlete_id=row.athlete_id,
+            event_id=row.event_id,
+            date=row.date,
+        )
+        for row in rows
+        for kind, ql_id, value in stats[row.id].awards
+        if kind in RecentAchievement.FEED_KINDS
+    ], batch_size=500, ignore_conflicts=True)
+
+
+def recent_achievements(size=FEED_SIZE):
+    """The newest achievements, with everything shown read in one query."""
+    return RecentAchievement.objects.select_related(
+        'athlete', 'event', 'result'
+    ).order_by(
+        '-date', '-id'
+    )[:size]
@@ -0,0 +1,21 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def use_wal(sender, connection, **kwargs):
+    """Put SQLite in write-ahead log mode, so pages can still be read while
+    an import or the stats worker is writing."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+
+class TrackappConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'trackapp'
+
+    def ready(self):
+        # Connect the signal handlers that keep cached data up to date
+        from . import profiles, qualifying
+
+        connection_created.connect(use_wal)
@@ -0,0 +1,120 @@
+import datetime
+import re
+
+# Tried in order until one parses, the one that does is then tried first
+# for every other value in the column
+DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%m/%d/%Y',
+    '%m/%d/%y',
+    '%b %d, %Y',
+    '%B %d, %Y',
+    '%b %d %Y',
+    '%B %d %Y',
+    '%d %b %Y',
+    '%d %B %Y',
+    '%a, %b %d, %Y',
+    '%A, %B %d, %Y',
+    '%m-%d-%Y',
+    '%Y/%m/%d',
+    '%Y-%m-%d %H:%M:%S',
+]
+
+# A month and day with no year, e.g. "1/14"
+MONTH_DAY = re.compile(r"(\d{1,2})/(\d{1,2})")
+
+# A month name and day with no year, e.g. "Jan 14" or "14 January"
+MONTH_NAME_DAY_FORMATS = ['%b %d', '%B %d', '%d %b', '%d %B']
+
+# "2022", "2021-22", "Indoor 2021/2022"
+SEASON_YEARS = re.compile(r"(\d{4})(?:\s*[-/]\s*(\d{4}|\d{2}))?")
+
+
+def season_years(season):
+    """The first and last year a season's name covers, or None."""
+    match = season and SEASON_YEARS.search(season.name)
+    if not match:
+        return None
+    first, last = match.groups()
+    first = int(first)
+    if not last:
+        return first, first
+    if len(last) == 2:
+        last = first // 100 * 100 + int(last)
+        if last < first:
+            last += 100
+    return first, int(last)
+
+
+class DateResolver:
+    """Turns a column of date cells into dates.
+
+    Each distinct string is only parsed once. The format that parsed the
+    last string is tried first, then the strict DATE_FORMATS, and only
+    values none of them match go to dateparser. Dates without a year take
+    it from the season, for a season over two years the autumn months are
+    in the first year.
+    """
+
+    def __init__(self, season=None):
+        self.years = season_years(season)
+        self.format = None
+        self.dates = {}
+
+    def resolve(self, value):
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        if isinstance(value, datetime.date) or value is None:
+            return value
+
+        text = str(value).strip()
+        try:
+            return self.dates[text]
+        except KeyError:
+            date = self.dates[text] = self.parse(text)
+            return date
+
+    def parse(self, text):
+        if self.format:
+            try:
+                return datetime.datetime.strptime(text, self.format).date()
+            except ValueError:
+                pass
+
+        for date_format in DATE_FORMATS:
+            try:
+                date = datetime.datetime.strptime(text, date_format).date()
+            except ValueError:
+                continue
+            self.format = date_format
+            return date
+
+        match = MONTH_DAY.fullmatch(text)
+        if match:
+            month, day = int(match.group(1)), int(match.group(2))
+            try:
+                return datetime.date(self.year_for(month), month, day)
+            except ValueError:
+                return None
+
+        for date_format in MONTH_NAME_DAY_FORMATS:
+            try:
+                # Read with a leap year, so 29 February parses
+                date = datetime.datetime.strptime(f"{text} 2000", f"{date_format} %Y")
+            except ValueError:
+                continue
+            try:
+                return datetime.date(self.year_for(date.month), date.month, date.day)
+            except ValueError:
+                return None
+
+        # dateparser is slow to import as well as to call
+        import dateparser
+        parsed = dateparser.parse(text)
+        return parsed.date() if parsed else None
+
+    def year_for(self, month):
+        if not self.years:
+            return datetime.date.today().year
+        first, last = self.years
+        return first if month >= 7 else last
@@ -0,0 +1,108 @@
+import functools
+import re
+
+from .event_dict import EVENT_DICT
+
+# Events with one of these words in their name are timed, the rest are
+# measured in inches
+TIMED_EVENT = re.compile(r"meter|smr|hurdle|yard|mile|medley", re.IGNORECASE)
+
+NGRAM_SIZE = 3
+
+# How alike a name has to be to a known one, from 0 to 1, to be suggested
+# in its place
+SUGGEST_CUTOFF = 0.5
+
+DIGITS = re.compile(r"\d+")
+
+
+def get_unit_for_event(event_name):
+    return 'seconds' if TIMED_EVENT.search(event_name) else 'inches'
+
+
+def event_key(name):
+    """A name lower cased with its whitespace collapsed, for lookups."""
+    return ' '.join(name.split()).lower()
+
+
+def ngrams(key):
+    padded = f" {key} "
+    return {padded[x:x + NGRAM_SIZE] for x in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+class EventNames:
+    """Canonical event names for the names found in spreadsheets.
+
+    Built once from EVENT_DICT, where '' means the name is already
+    canonical. Lookups ignore case and whitespace. Names that still don't
+    match are compared to every known name through an index of their
+    n-grams, which is how a suggestion is found without scoring every name.
+    """
+
+    def __init__(self, event_dict):
+        self.canonical = {}
+        for name, canonical in event_dict.items():
+            canonical = ' '.join((canonical or name).split())
+            self.canonical.setdefault(event_key(name), canonical)
+            self.canonical.setdefault(event_key(canonical), canonical)
+
+        self.ngrams = {}
+        self.sizes = {}
+        for key in self.canonical:
+            grams = ngrams(key)
+            self.sizes[key] = len(grams)
+            for gram in grams:
+                self.ngrams.setdefault(gram, []).append(key)
+
+    def lookup(self, name):
+        """The canonical name for a known name, or None."""
+        return self.canonical.get(event_key(name))
+
+    def closest(self, name):
+        """(canonical name, score) for the known name most like name.
+
+        The score is the Dice coefficient of their n-grams. Names with
+        different numbers in them are never alike, 300 Meters isn't a
+        misspelling of 3000 Meters. Returns (None, 0) without a match.
+        """
+        key = event_key(name)
+        grams = ngrams(key)
+        shared = {}
+        for gram in grams:
+            for other in self.ngrams.get(gram, ()):
+                shared[other] = shared.get(other, 0) + 1
+
+        digits = DIGITS.findall(key)
+        best, best_score = None, 0
+        for other, count in sorted(shared.items()):
+            score = 2 * count / (len(grams) + self.sizes[other])
+            if score > best_score and DIGITS.findall(other) == digits:
+                best, best_score = other, score
+        return (self.canonical[best], best_score) if best else (None, 0)
+
+
+EVENT_NAMES = EventNames(EVENT_DICT)
+
+
+def event_name_text(value):
+    """A spreadsheet cell as an event name, 300 and 300.0 become "300"."""
+    try:
+        return str(int(value))
+    except (TypeError, ValueError):
+        return ' '.join(str(value).split())
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_event_name(value):
+    """The canonical name for an event cell, or None if it isn't known.
+
+    Only case and whitespace are ignored, a misspelling is never taken as
+    a known name. suggest_event_name finds the name it might have meant.
+    """
+    return EVENT_NAMES.lookup(event_name_text(value))
+
+
+def suggest_event_name(value):
+    """The closest known canonical name for an event cell, or None."""
+    canonical, score = EVENT_NAMES.closest(event_name_text(value))
+    return canonical if score >= SUGGEST_CUTOFF else None
@@ -3,11 +3,24 @@ from crispy_forms.layout import Layout, Submit, Div
 from crispy_forms.helper import FormHelper
 
 from django import forms
+from django.core.validators import FileExtensionValidator
 
 from .models import *
+from .importers import CSV_EXTENSIONS
+
+SPREADSHEET_EXTENSIONS = ['xlsx'] + [extension[1:] for extension in CSV_EXTENSIONS]
+
+
+def spreadsheet_field():
+    return forms.FileField(
+        validators=[FileExtensionValidator(SPREADSHEET_EXTENSIONS)],
+        widget=forms.ClearableFileInput(attrs={
+            'accept': ",".join(f".{extension}" for extension in SPREADSHEET_EXTENSIONS)}),
+        help_text="An xlsx workbook, or a CSV or TSV export with the same headers.")
+
 
 class UploadForm(forms.Form):
-    file = forms.FileField()
+    file = spreadsheet_field()
     team = forms.ModelChoiceField(queryset=Team.objects.all().order_by('name'))
     season = forms.ModelChoiceField(queryset=Season.objects.all().order_by('name'))
     GENDER_CHOICES = [
@@ -15,9 +28,11 @@ class UploadForm(forms.Form):
         ('female', 'Female')
     ]
     gender = forms.ChoiceField(choices=GENDER_CHOICES)
+    dry_run = forms.BooleanField(
+        required=False, label="Only check the file, don't import it")
 
 class QualifyingUploadForm(forms.Form):
-    file = forms.FileField()
+    file = spreadsheet_field()
     season = forms.ModelChoiceField(queryset=Season.objects.all().order_by('name'))
 
 class UserForm(forms.ModelForm):
@@ -31,7 +46,7 @@ class ResultForm(forms.ModelForm):
         model = Result
         exclude = [
             'id', 'athlete', 
-            'qualifications', 'milestones', 'personal_rank']
+            'qualifications', 'personal_rank']
 
     def __init__(self, *args, **kwargs):
         super(ResultForm, self).__init__(*args, **kwargs)
@@ -115,3 +130,18 @@ class QualifyingFilterForm(forms.Form):
 
 
 
+
+
+class LeaderboardFilterForm(forms.Form):
+    gender = forms.ChoiceField(
+        choices=QualifyingFilterForm.GENDER_CHOICES, required=False)
+
+    season = forms.ModelChoiceField(
+        queryset=Season.objects.all().order_by('name'),
+        required=False,
+        empty_label="All time")
+
+    team = forms.ModelChoiceField(
+        queryset=Team.objects.all().order_by('name'),
+        required=False,
+        empty_label="All teams")
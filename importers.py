@@ -1,273 +1,740 @@
-import dateparser
-import datetime
-
+import codecs
+import csv
+import itertools
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
 from django.db import IntegrityError, transaction
+from django.utils import timezone
 from openpyxl import load_workbook
 
-from .event_dict import EVENT_DICT
+from .dates import DateResolver
+from .events import (
+    event_name_text, get_unit_for_event, normalize_event_name, suggest_event_name)
 from .models import *
-
-def get_unit_for_event(event_name):
-    unit = 'inches'
-    if 'meter' in event_name.lower():
-        unit = 'seconds'
-    elif 'smr' in event_name.lower():
-        unit = 'seconds'
-    elif 'hurdle' in event_name.lower():
-        unit = 'seconds'
-    elif 'hurdle' in event_name.lower():
-        unit = 'seconds'
-    elif 'yard' in event_name.lower():
-        unit = 'seconds'
-    elif 'mile' in event_name.lower():
-        unit = 'seconds'
-    elif 'medley' in event_name.lower():
-        unit = 'seconds'
-    return unit
-
-
-
-
-def import_performances(data_file, team, season, gender):
-    wb = load_workbook(data_file)
-    sheet = wb.active
-
-    meets = {}
-    for meet in Meet.objects.filter(season=season, team=team):
-        key = f"{meet.description}--{meet.season.name}"
-        meets[key] = meet
+from .jobs import enqueue_stats
+from .marks import is_no_mark, parse_marks_by_unit
+from .qualifying import invalidate_qualifying_index
+from .stats import requalify, stats_groups, update_result_stats
+
+
+# Rows parsed and written at a time, so memory use doesn't grow with the file
+IMPORT_BATCH_SIZE = 1000
+
+
+def read_sheet_rows(data_file, sheet_name=None):
+    """Stream a sheet's rows as dicts keyed by lower case header.
+
+    Reads the active sheet unless given a sheet name. The workbook is
+    opened read only, so rows are read from the file as they are needed
+    instead of loading the whole sheet into memory. Every row has a key
+    for every header, None for missing cells.
+    """
+    wb = load_workbook(data_file, read_only=True)
+    try:
+        sheet = wb[sheet_name] if sheet_name else wb.active
+        rows = sheet.iter_rows(values_only=True)
+        headers = [
+            header.lower() if isinstance(header, str) else header
+            for header in next(rows, ())
+        ]
+        for row in rows:
+            yield dict(zip(headers, itertools.chain(row, itertools.repeat(None))))
+    finally:
+        wb.close()
+
+
+def sheet_names(data_file):
+    wb = load_workbook(data_file, read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+
+# Files with these extensions are read as delimited text rather than xlsx
+CSV_EXTENSIONS = ['.csv', '.tsv', '.txt']
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def iter_upload_lines(data_file):
+    """Decoded lines of an upload or a path, read a chunk at a time.
+
+    Uploaded files are read through UploadedFile.chunks(), so the file is
+    never held in memory as a whole.
+    """
+    if isinstance(data_file, (str, os.PathLike)):
+        with open(data_file, 'rb') as f:
+            yield from iter_upload_lines(File(f))
+        return
+
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    pending = ''
+    for chunk in data_file.chunks(UPLOAD_CHUNK_SIZE):
+        # The last line may continue in the next chunk
+        *lines, pending = (pending + decoder.decode(chunk)).split('\n')
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def read_csv_rows(data_file):
+    """Stream a CSV or TSV file's rows as dicts keyed by lower case header.
+
+    Uses the same headers as the xlsx sheets. The delimiter is a tab when
+    the header line has one, a comma otherwise, and empty or missing cells
+    are None like they are in a sheet.
+    """
+    lines = iter_upload_lines(data_file)
+    header_line = next(lines, '')
+    delimiter = '\t' if '\t' in header_line else ','
+    rows = csv.reader(itertools.chain([header_line], lines), delimiter=delimiter)
+
+    headers = [header.lower() for header in next(rows, [])]
+    for row in rows:
+        if row:
+            values = [value if value != '' else None for value in row]
+            # Spreadsheets often leave off empty cells at the end of a row
+            values += [None] * (len(headers) - len(values))
+            yield dict(zip(headers, values))
+
+
+def read_rows(data_file):
+    """Rows of an xlsx, CSV or TSV file, picked by the file's extension."""
+    name = getattr(data_file, 'name', None) or str(data_file)
+    if os.path.splitext(name)[1].lower() in CSV_EXTENSIONS:
+        return read_csv_rows(data_file)
+    return read_sheet_rows(data_file)
+
+
+def import_source(data_file, sheet_name=None):
+    """Names the file, and sheet if given, rows are imported from.
+
+    Paths are made absolute so a file matches however it is given. An
+    upload only has its file name.
+    """
+    if isinstance(data_file, (str, os.PathLike)):
+        name = os.path.abspath(data_file)
+    else:
+        name = data_file.name
+    return f"{name} [{sheet_name}]" if sheet_name else name
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def event_units():
+    """Event name to unit for every saved event, the units an import starts
+    with."""
+    # Newest first so that the oldest of any duplicates wins, as in ImportContext
+    return dict(Event.objects.order_by('-id').values_list('name', 'unit'))
+
+
+class ImportContext:
+    """Name keyed maps of the users, events and meets an import refers to.
+
+    Everything is loaded once up front instead of being looked up row by
+    row. Users, events and meets that don't exist yet are made on first use
+    and created in bulk by save_new().
+    """
+
+    def __init__(self, team=None, season=None, gender=None):
+        self.team = team
+        self.season = season
+        self.gender = gender
+        self.dates = DateResolver(season)
+
+        # Loaded newest first so that the oldest of any duplicates wins
+        self.users = {
+            (user.first_name, user.last_name): user
+            for user in User.objects.order_by('-id')
+        }
+        self.events = {
+            event.name: event for event in Event.objects.order_by('-id')}
+        self.meets = {}
+        if team and season:
+            self.meets = {
+                (meet.description, meet.season_id): meet
+                for meet in Meet.objects.filter(team=team, season=season)
+            }
+
+        self.new_users = []
+        self.new_events = []
+        self.new_meets = []
+
+    def units(self):
+        """Event name to unit for every event known so far."""
+        return {name: event.unit for name, event in self.events.items()}
+
+    def user(self, first_name, last_name):
+        user = self.users.get((first_name, last_name))
+        if user is None:
+            username = f"{first_name.lower()}.{last_name.lower()}"
+            print(f"Creating user {username}")
+            user = User(
+                username=username,
+                first_name=first_name,
+                last_name=last_name,
+                gender=self.gender
+            )
+            self.users[(first_name, last_name)] = user
+            self.new_users.append(user)
+        return user
+
+    def event(self, event_name):
+        event = self.events.get(event_name)
+        if event is None:
+            print(f"Creating event {event_name}")
+            event = Event(
+                name=event_name,
+                unit=get_unit_for_event(event_name)
+            )
+            self.events[event_name] = event
+            self.new_events.append(event)
+        return event
+
+    def meet(self, meet_name, meet_date):
+        meet = self.meets.get((meet_name, self.season.id))
+        if meet is None:
+            print(f"Creating {meet_name} for {self.team.name}")
+            meet = Meet(
+                description=meet_name,
+                season=self.season,
+                date=meet_date,
+                team=self.team,
+            )
+            self.meets[(meet_name, self.season.id)] = meet
+            self.new_meets.append(meet)
+        return meet
+
+    def save_new(self):
+        """Create every new user, event and meet, one insert for each.
+
+        bulk_create doesn't set primary keys on SQLite, so they are read
+        back by name.
+        """
+        if self.new_users:
+            User.objects.bulk_create(self.new_users)
+            ids = dict(User.objects.filter(
+                username__in=[user.username for user in self.new_users]
+            ).values_list('username', 'id'))
+            for user in self.new_users:
+                user.pk = ids[user.username]
+
+        if self.new_events:
+            Event.objects.bulk_create(self.new_events)
+            ids = dict(Event.objects.filter(
+                name__in=[event.name for event in self.new_events]
+            ).order_by('id').values_list('name', 'id'))
+            for event in self.new_events:
+                event.pk = ids[event.name]
+
+        if self.new_meets:
+            Meet.objects.bulk_create(self.new_meets)
+            ids = dict(Meet.objects.filter(
+                team=self.team,
+                season=self.season,
+                description__in=[meet.description for meet in self.new_meets],
+            ).order_by('id').values_list('description', 'id'))
+            for meet in self.new_meets:
+                meet.pk = ids[meet.description]
+
+        self.new_users = []
+        self.new_events = []
+        self.new_meets = []
+
+
+def import_performances(data_file, team, season, gender, chunk_size=None):
+    """Import a performance spreadsheet.
+
+    The whole file is one transaction unless given a chunk size, then it
+    is committed that many rows at a time and the ImportRun recording its
+    progress is returned.
+    """
+    if chunk_size:
+        run = ImportRun.objects.create(
+            name=import_source(data_file),
+            team=team,
+            season=season,
+            gender=gender,
+            chunk_size=chunk_size,
+        )
+        return continue_import(run, data_file)
+
+    context = ImportContext(team, season, gender)
 
     with transaction.atomic():
-        headers = []
-        for header in sheet[1]:
-            headers.append(header.value.lower())
-
-        total = 0
-        users = set()
-        for row in sheet.iter_rows(min_row=2, values_only=True):
-            row = dict(zip(headers, row))
+        sheet_rows = parse_sheet_rows(
+            read_rows(data_file), context.dates, context.units())
+        total, groups = write_sheet_rows(
+            sheet_rows, context, import_source(data_file))
 
-            if not (row['last name'] or row['first name']):
-                continue
+        # Recalc
+        enqueue_stats(groups)
 
-            first_name = row['first name'].strip().capitalize()
-            last_name = row['last name'].strip().capitalize()
-            username = f"{first_name.lower()}.{last_name.lower()}"
+        #raise Exception("Data Test.")
 
-            try:
-                user = User.objects.get(
-                    first_name=first_name,
-                    last_name=last_name
-                )
-            except User.DoesNotExist:
-                print(f"Creating user {username}")
-                user = User(
-                    username=username,
-                    first_name=first_name,
-                    last_name=last_name,
-                    gender=gender
-                )
-                user.save()
-            users.add(user)
 
-            event_name = row['event']
-            try:
-                event_name = str(int(event_name))
-            except:
-                pass
-            event_name = str(event_name).strip()
-
-            if event_name in EVENT_DICT:
-                if EVENT_DICT[event_name] != '':
-                    event_name = EVENT_DICT[event_name]
-            else:
-                raise Exception(f"Unknown event {event_name}")
-
-            unit = get_unit_for_event(event_name)
-            try:
-                event = Event.objects.get(name=event_name)
-            except Event.DoesNotExist:
-                print(f"Creating event {event_name}")
-                event = Event(
-                    name=event_name,
-                    unit=unit
-                )
-                event.save()
-
-            if 'meet' in row:
-                meet_name = row['meet']
-                meet_date = row['date'].date()
-            elif 'opponent' in row:
-                meet_name = row['opponent']
-                meet_date = row['date']
-                if isinstance(meet_date, str):
-                    meet_date = dateparser.parse(meet_date)
-                else:
-                    meet_date = meet_date.date()
-            else:
-                meet_name = row['date']
-                date_str = meet_name.split(' ')[0]
-                date_str += '/2019'
-                meet_date = datetime.datetime.strptime(date_str, "%m/%d/%Y").date()
-
-            meet_name = meet_name.strip()
-            meet_name = meet_name.replace("Cetnral", "Central")
-
-            key = f"{meet_name}--{season.name}"
-            meet = meets.get(key)
-            if not meet:
-                print(f"Creating {meet_name} for {team.name}")
-                meet = Meet(
-                    description=meet_name,
-                    season=season,
-                    date=meet_date,
-                    team=team,
-                )
-                meet.save()
-                meets[key] = meet
+    print(f"{total} rows processed") 
 
-            performance = row['performance']
-            if isinstance(performance, str):
-                # Fix common mistakes:
-                performance = performance.replace('..', '.')
-
-                if "-" in performance:
-                    feet, inches = performance.split("-")
-                    feet = float(feet)
-                    inches = float(inches)
-                    performance = (12.0 * feet) + inches
-                elif ':' in performance:
-                    performance = performance.replace(',', '.')
-                    if '.' not in performance:
-                        performance += '.0'
-
-                    try:
-                        pt = datetime.datetime.strptime(performance,'%M:%S.%f')
-                    except:
-                        print(f"Bad peformance {performance} for {user.username}")
-                        raise
-                    performance = pt.second + pt.minute*60.0 + pt.hour*3600.0 + (pt.microsecond/1000000.0)
 
-            try:
-                performance = float(performance)
-            except:
-                print(f"*** Bad peformance {performance} for {user.username}")
+def continue_import(run, data_file):
+    """Import the rows of a file an ImportRun hasn't committed yet.
+
+    Each chunk of rows is written in its own transaction along with the
+    run's progress and the stats jobs for its results, so other requests
+    only wait for one chunk at a time. After a crash calling this again
+    with the same file carries on from the last committed chunk. Returns
+    the run.
+
+    Only the run's name is kept, not the file, so an uploaded file has to
+    be given again to resume it. Results are fingerprinted with the run's
+    name whichever way the file is given.
+    """
+    context = ImportContext(run.team, run.season, run.gender)
+    writer = SheetWriter(context, run.name)
+    sheet_rows = parse_sheet_rows(
+        read_rows(data_file), context.dates, context.units())
+
+    done = 0
+    try:
+        for chunk in batched(sheet_rows, run.chunk_size):
+            if done + len(chunk) <= run.rows_done:
+                # Already committed, only counted for the fingerprints
+                writer.results(chunk)
+                done += len(chunk)
                 continue
 
+            with transaction.atomic():
+                written = writer.write(chunk)
+                enqueue_stats(stats_groups(written))
+                done += len(chunk)
+                run.rows_done = done
+                run.results += len(written)
+                run.save(update_fields=['rows_done', 'results', 'updated'])
+            print(f"{run.name}: {done} rows committed")
+    except Exception as e:
+        run.error = str(e) or repr(e)
+        run.save(update_fields=['error', 'updated'])
+        raise
+
+    run.error = ''
+    run.finished = timezone.now()
+    run.save(update_fields=['error', 'finished', 'updated'])
+    print(f"{run.results} rows processed")
+    return run
+
+
+REQUIRED_HEADERS = ['first name', 'last name', 'event', 'performance']
+MEET_HEADERS = ['meet', 'opponent', 'date']
+METHOD_HEADERS = ['fat/ht/na', 'fat / hand']
+
+
+def missing_headers(row):
+    """The performance sheet columns a row read from a sheet doesn't have."""
+    missing = [header for header in REQUIRED_HEADERS if header not in row]
+    if not any(header in row for header in MEET_HEADERS):
+        missing.append(" or ".join(MEET_HEADERS))
+    if not any(header in row for header in METHOD_HEADERS):
+        missing.append(" or ".join(METHOD_HEADERS))
+    return missing
+
+
+# A spreadsheet row with its names cleaned up, read without the database
+SheetRow = namedtuple('SheetRow', [
+    'first_name', 'last_name', 'event_name', 'meet_name', 'meet_date',
+    'performance', 'method'])
+
+
+def read_performance_row(row, dates):
+    """A SheetRow for a spreadsheet row, or None to skip the row.
+
+    ``dates`` is a DateResolver. Raises ValueError for a row that can't be
+    imported. The performance is left as the raw cell.
+    """
+    if not (row['last name'] or row['first name']):
+        return None
+    if not row['first name']:
+        raise ValueError("Missing first name")
+    if not row['last name']:
+        raise ValueError("Missing last name")
+
+    first_name = row['first name'].strip().capitalize()
+    last_name = row['last name'].strip().capitalize()
+
+    event_name = normalize_event_name(row['event'])
+    if event_name is None:
+        message = f"Unknown event {event_name_text(row['event'])}"
+        suggestion = suggest_event_name(row['event'])
+        if suggestion:
+            message += f", did you mean {suggestion}?"
+        raise ValueError(message)
+
+    if 'meet' in row:
+        meet_name = row['meet']
+        meet_date = dates.resolve(row['date'])
+    elif 'opponent' in row:
+        meet_name = row['opponent']
+        meet_date = dates.resolve(row['date'])
+    else:
+        # e.g. "1/14 Central", the year comes from the season
+        meet_name = row['date']
+        meet_date = dates.resolve(str(meet_name).split(' ')[0]) if meet_name else None
+
+    if not meet_name:
+        raise ValueError("Missing meet")
+    if meet_date is None:
+        raise ValueError(f"Unknown date {row['date']}")
+
+    meet_name = str(meet_name).strip()
+    meet_name = meet_name.replace("Cetnral", "Central")
+
+    if 'fat/ht/na' in row:
+        method = row['fat/ht/na']
+    else:
+        method = row['fat / hand']
+
+    if method == 'HT':
+        method = 'Hand'
+
+    return SheetRow(
+        first_name, last_name, event_name, meet_name, meet_date,
+        row['performance'], method)
+
+
+def parse_sheet_rows(rows, dates, units):
+    """SheetRows for spreadsheet rows with their performances parsed.
+
+    ``units`` maps the names of existing events to their unit. A row whose
+    performance isn't a valid mark is kept with None, so its athlete,
+    event and meet are still created. Raises ValueError like
+    read_performance_row.
+    """
+    for batch in batched(rows, IMPORT_BATCH_SIZE):
+        sheet_rows = [
+            sheet_row for sheet_row in (
+                read_performance_row(row, dates) for row in batch)
+            if sheet_row
+        ]
+        marks = parse_marks_by_unit(
+            [row.performance for row in sheet_rows],
+            [units.get(row.event_name) or get_unit_for_event(row.event_name)
+             for row in sheet_rows])
+
+        for row, mark in zip(sheet_rows, marks):
+            if mark is None and not is_no_mark(row.performance):
+                username = f"{row.first_name.lower()}.{row.last_name.lower()}"
+                print(f"*** Bad peformance {row.performance} for {username}")
+            yield row._replace(performance=mark)
+
+
+class SheetWriter:
+    """Turns one sheet's SheetRows into Results and writes them.
+
+    Results are fingerprinted by the sheet's source, athlete, event, meet
+    and how many results for the same three came before them in the
+    sheet, so re-importing a sheet only writes the rows that are new or
+    changed, and another sheet never replaces its results. The writer
+    keeps those counts, so a sheet's rows must all go through the same
+    writer in order.
+    """
+
+    def __init__(self, context, source):
+        self.context = context
+        self.source = source
+        self.occurrences = {}
+        self.seen = set()
+
+    def results(self, sheet_rows):
+        """Unsaved Results for SheetRows, creating athletes, events and meets."""
+        context = self.context
+        rows = []
+        for row in sheet_rows:
+            athlete = context.user(row.first_name, row.last_name)
+            event = context.event(row.event_name)
+            meet = context.meet(row.meet_name, row.meet_date)
+            rows.append((athlete, event, meet, row))
+        context.save_new()
+
+        results = []
+        for athlete, event, meet, row in rows:
+            key = (meet.pk, event.pk, athlete.pk)
+            # Rows repeated in the sheet are only imported once
+            if row.performance is None or (key, row.performance) in self.seen:
+                continue
+            self.seen.add((key, row.performance))
+            occurrence = self.occurrences.get(key, 0)
+            self.occurrences[key] = occurrence + 1
+            results.append(Result(
+                meet=meet,
+                event=event,
+                athlete=athlete,
+                result=row.performance,
+                method=row.method,
+                fingerprint=result_fingerprint(self.source, *key, occurrence),
+            ))
+        return results
+
+    def write(self, sheet_rows):
+        """Save SheetRows, returns the results that were new or changed."""
+        return write_results(self.results(sheet_rows))
+
+
+def write_sheet_rows(sheet_rows, context, source):
+    """Write parsed SheetRows from source a batch at a time.
+
+    Returns the number of results written and the stats groups they touch.
+    """
+    writer = SheetWriter(context, source)
+    total = 0
+    groups = set()
+    for batch in batched(sheet_rows, IMPORT_BATCH_SIZE):
+        # Each batch is its own savepoint
+        with transaction.atomic():
+            written = writer.write(batch)
+        total += len(written)
+        groups.update(stats_groups(written))
+    return total, groups
+
+
+def find_import_files(directory):
+    """Every xlsx, CSV and TSV file under a directory, in name order."""
+    extensions = ['.xlsx'] + CSV_EXTENSIONS
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            # Skip the lock files Excel leaves next to open workbooks
+            if name.startswith('~$'):
+                continue
+            if os.path.splitext(name)[1].lower() in extensions:
+                paths.append(os.path.join(root, name))
+    return paths
+
+
+def list_import_sheets(paths):
+    """(path, sheet name) for every sheet of the files, None for text files
+    and workbooks that can't be opened."""
+    sheets = []
+    for path in paths:
+        if os.path.splitext(path)[1].lower() in CSV_EXTENSIONS:
+            sheets.append((path, None))
+        else:
             try:
-                result = Result.objects.get(
-                    meet=meet,
-                    event=event,
-                    athlete=user,
-                    result=performance
-                )
-            except Result.DoesNotExist:
-                if 'fat/ht/na' in row:
-                    method = row['fat/ht/na']
-                else:
-                    method = row['fat / hand']
-
-                if method == 'HT':
-                    method = 'Hand'
-
-                result = Result(
-                    meet=meet,
-                    event=event,
-                    athlete=user,
-                    result=performance,
-                    method=method
-                )
-                result.save()
-                total += 1
-
-        # Recalc
-        for user in users:
-            calculate_result_stats(user)
-
-        #raise Exception("Data Test.")
-
-
-    print(f"{total} rows processed") 
+                names = sheet_names(path)
+            except Exception:
+                # Reported as the file's error when it is parsed
+                names = [None]
+            sheets.extend((path, name) for name in names)
+    return sheets
+
+
+def parse_import_sheet(path, sheet_name, season, units):
+    """Parse one sheet without the database, for a worker process.
+
+    Returns (path, sheet name, SheetRows, error). A sheet with an error
+    isn't imported at all, so error is None for the rest. Nothing wrong
+    with a sheet is raised, so one bad sheet can't stop the others.
+    """
+    try:
+        if sheet_name is None:
+            rows = read_rows(path)
+        else:
+            rows = read_sheet_rows(path, sheet_name)
+
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return path, sheet_name, [], None
+        missing = missing_headers(first)
+        if missing:
+            return path, sheet_name, [], f"Missing columns {', '.join(missing)}"
+
+        sheet_rows = list(parse_sheet_rows(
+            itertools.chain([first], rows), DateResolver(season), units))
+    except ValueError as e:
+        return path, sheet_name, [], str(e)
+    except Exception as e:
+        return path, sheet_name, [], f"{type(e).__name__}: {e}"
+    return path, sheet_name, sheet_rows, None
+
+
+def import_files(paths, team, season, gender, workers=None):
+    """Import every sheet of many performance files.
+
+    Sheets are parsed on a pool of worker processes while this process
+    writes them one at a time, in order, each in its own transaction.
+    Sheets that can't be parsed are reported and skipped. Stats are
+    recalculated once at the end for every athlete and event that changed,
+    including when a write fails part way, for the sheets committed before
+    it. Returns the StatsReport.
+    """
+    context = ImportContext(team, season, gender)
+    sheets = list_import_sheets(paths)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(sheets))
+
+    args = (
+        [path for path, name in sheets],
+        [name for path, name in sheets],
+        [season] * len(sheets),
+        [context.units()] * len(sheets),
+    )
+    if workers <= 1:
+        parsed = map(parse_import_sheet, *args)
+        pool = None
+    else:
+        # Workers are forked and never touch the database
+        pool = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('fork'))
+        parsed = pool.map(parse_import_sheet, *args)
+
+    total = 0
+    groups = set()
+    try:
+        for path, sheet_name, sheet_rows, error in parsed:
+            label = f"{path} [{sheet_name}]" if sheet_name else path
+            if error:
+                print(f"Skipping {label}: {error}")
+                continue
+            with transaction.atomic():
+                sheet_total, sheet_groups = write_sheet_rows(
+                    sheet_rows, context, import_source(path, sheet_name))
+            print(f"{label}: {sheet_total} new or changed results")
+            total += sheet_total
+            groups |= sheet_groups
+    finally:
+        if pool:
+            pool.shutdown()
+        print(f"{total} rows processed")
+        report = update_result_stats(groups, workers=settings.STATS_WORKERS)
+    return report
+
+
+def write_results(results):
+    """Save fingerprinted results, returns the ones that were new or changed.
+
+    Results are matched to saved ones by fingerprint: an unchanged result
+    is skipped and a changed one gets the new mark and method. A new result
+    with the same meet, event, athlete and mark as a saved one, such as one
+    entered by hand, is a duplicate and isn't added.
+    """
+    if not results:
+        return []
+
+    saved = {}
+    for batch in batched([result.fingerprint for result in results], 500):
+        for fingerprint, result_id, mark, method in Result.objects.filter(
+                fingerprint__in=batch).values_list('fingerprint', 'id', 'result', 'method'):
+            saved[fingerprint] = (result_id, mark, method)
+
+    new_results = []
+    changed_results = []
+    for result in results:
+        match = saved.get(result.fingerprint)
+        if match is None:
+            new_results.append(result)
+        elif match[1:] != (result.result, result.method):
+            result.pk = match[0]
+            changed_results.append(result)
+    Result.objects.bulk_update(changed_results, ['result', 'method'], batch_size=500)
+
+    if new_results:
+        duplicates = set(Result.objects.filter(
+            meet__in={result.meet_id for result in new_results},
+            event__in={result.event_id for result in new_results},
+            athlete__in={result.athlete_id for result in new_results},
+        ).values_list('meet_id', 'event_id', 'athlete_id', 'result'))
+        new_results = [
+            result for result in new_results
+            if (result.meet_id, result.event_id, result.athlete_id, result.result) not in duplicates
+        ]
+
+    Result.objects.bulk_create(new_results, batch_size=500)
+    return new_results + changed_results
 
 
 
 def import_qualifying(data_file, season):
-    wb = load_workbook(data_file)
-    sheet = wb.active
+    context = ImportContext(season=season)
     with transaction.atomic():
-        headers = []
-        for header in sheet[1]:
-            headers.append(header.value.lower())
-
-        total = 0
-        users = set()
-        for row in sheet.iter_rows(min_row=2, values_only=True):
-            row = dict(zip(headers, row))
-
+        levels = []
+        for row in read_rows(data_file):
             description = row['description']
             if not description:
                 continue
             description = description.strip()
             gender = row['gender'].strip()
 
-            event_name = row['event'].strip()
-            if event_name in EVENT_DICT:
-                if EVENT_DICT[event_name] != '':
-                    event_name = EVENT_DICT[event_name]
-
-            try:
-                event = Event.objects.get(name=event_name)
-            except Event.DoesNotExist:
-                print(f"Creating {event_name}")
-                unit = get_unit_for_event(event_name)
-                event = Event(
-                    name=event_name,
-                    unit=unit
-                )
-                event.save()
+            event_name = normalize_event_name(row['event']) or row['event'].strip()
 
+            event = context.event(event_name)
 
             performance = row['performance']
             if performance == 'NA':
                 continue
-            if isinstance(performance, str):
-                if "-" in performance:
-                    feet, inches = performance.split("-")
-                    feet = float(feet)
-                    inches = float(inches)
-                    performance = (12.0 * feet) + inches
-                elif ':' in performance:
-                    try:
-                        pt = datetime.datetime.strptime(performance,'%M:%S.%f')
-                    except:
-                        import pdb; pdb.set_trace()
-                        print(f"Skipping {performance}")
-                        continue
-                    performance = pt.second + pt.minute*60.0 + pt.hour*3600.0 + (pt.microsecond/1000000.0)
-            elif isinstance(performance, datetime.time):
-                    performance = (performance.minute * 60) + performance.second + (performance.microsecond / 1000000.0)
-            try:
-                performance = float(performance)
-            except:
-                import pdb; pdb.set_trace()
+            levels.append((description, event, gender, performance))
+
+        context.save_new()
+
+        marks = parse_marks_by_unit(
+            [level[3] for level in levels], [level[1].unit for level in levels])
+
+        # Upserted in bulk, keyed on description, event, season and gender
+        saved = {
+            (ql.description, ql.event_id, ql.gender): ql
+            for ql in QualifyingLevel.objects.filter(
+                season=season).select_related('event').order_by('-id')
+        }
+        new_levels = []
+        changes = {}
+        for (description, event, gender, performance), mark in zip(levels, marks):
+            if mark is None:
                 print(f"Skipping {performance}")
                 continue
-
-            try:
-                qt = QualifyingLevel.objects.get(
-                    description=description,
-                    event=event,
-                    season=season,
-                    gender=gender
-                )
-            except QualifyingLevel.DoesNotExist:
+            key = (description, event.id, gender)
+            qt = saved.get(key)
+            if qt is None:
                 print(f"Creating {event.name} for {description} for {season.name}")
-                qt = QualifyingLevel(
+                qt = saved[key] = QualifyingLevel(
                     description=description,
                     event=event,
                     season=season,
-                    gender=gender
+                    gender=gender,
+                    value=mark
                 )
-            qt.value = performance
-            qt.save()
-            
+                new_levels.append(qt)
+            elif qt.value != mark:
+                if qt.pk:
+                    changes.setdefault(qt.pk, (qt, qt.value))
+                qt.value = mark
+
+        last_id = QualifyingLevel.objects.order_by('-id').values_list('id', flat=True).first()
+        QualifyingLevel.objects.bulk_create(new_levels)
+        # bulk_create doesn't set primary keys on SQLite. Only the rows just
+        # made are read back, an older duplicate of a level keeps its own.
+        for qt in QualifyingLevel.objects.filter(season=season, id__gt=last_id or 0):
+            saved[(qt.description, qt.event_id, qt.gender)].pk = qt.pk
+        QualifyingLevel.objects.bulk_update(
+            [qt for qt, old_value in changes.values()], ['value'], batch_size=500)
+
+        # Bulk writes don't send the signals that do this
+        invalidate_qualifying_index()
+        checked = requalify(
+            [(qt, None) for qt in new_levels] + list(changes.values()))
+
+    print(f"{len(new_levels)} levels created, {len(changes)} changed, {checked} results requalified")
@@ -0,0 +1,125 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import StatsJob
+from .profiles import bump_athlete_versions
+from .stats import recompute_stats
+
+
+def events_by_athlete_for(groups):
+    """Map athlete id to the event ids in groups, or None for all events."""
+    events_by_athlete = {}
+    for athlete_id, event_id in groups:
+        if event_id is None:
+            events_by_athlete[athlete_id] = None
+        elif events_by_athlete.get(athlete_id, set()) is not None:
+            events_by_athlete.setdefault(athlete_id, set()).add(event_id)
+    return events_by_athlete
+
+
+def enqueue_stats(groups):
+    """Queue stats to be recalculated for (athlete id, event id) groups.
+
+    An event id of None queues every event for the athlete. Jobs already
+    waiting for the same athlete and event are merged, and a waiting job for
+    all of an athlete's events covers any single event. With
+    settings.STATS_QUEUE off the stats are recalculated straight away.
+
+    The athletes' results have changed even if their stats haven't been
+    recalculated yet, so their cached profiles are invalidated on commit.
+    """
+    events_by_athlete = events_by_athlete_for(groups)
+    if not events_by_athlete:
+        return
+    transaction.on_commit(lambda: bump_athlete_versions(events_by_athlete))
+
+    if not settings.STATS_QUEUE:
+        recompute_stats(events_by_athlete)
+        return
+
+    waiting = set(StatsJob.objects.filter(
+        athlete_id__in=events_by_athlete, event=None, claimed=None,
+    ).values_list('athlete_id', flat=True))
+
+    jobs = []
+    for athlete_id, events in events_by_athlete.items():
+        if athlete_id in waiting:
+            continue
+        for event_id in [None] if events is None else sorted(events):
+            jobs.append(StatsJob(athlete_id=athlete_id, event_id=event_id))
+
+    all_events = [
+        athlete_id for athlete_id, events in events_by_athlete.items()
+        if events is None and athlete_id not in waiting
+    ]
+    with transaction.atomic():
+        if all_events:
+            StatsJob.objects.filter(
+                athlete_id__in=all_events, claimed=None).delete()
+        StatsJob.objects.bulk_create(jobs, ignore_conflicts=True)
+
+
+def enqueue_athlete_stats(athlete_ids):
+    """Queue every event of the given athletes."""
+    enqueue_stats((athlete_id, None) for athlete_id in athlete_ids)
+
+
+def stats_updating(athlete_ids):
+    """The athletes out of athlete_ids that still have stats jobs queued."""
+    return set(StatsJob.objects.filter(
+        athlete_id__in=athlete_ids,
+    ).values_list('athlete_id', flat=True).distinct())
+
+
+def claim_stats_jobs(limit):
+    """Mark up to limit of the oldest waiting jobs as claimed and return them.
+
+    Only jobs that were still unclaimed are updated, so when two workers
+    race for the same job just one of them gets it.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(StatsJob.objects.filter(
+            claimed=None,
+        ).order_by(
+            'created', 'id'
+        ).values_list('id', flat=True)[:limit])
+        StatsJob.objects.filter(id__in=ids, claimed=None).update(claimed=now)
+    return list(StatsJob.objects.filter(id__in=ids, claimed=now))
+
+
+def run_stats_jobs(limit=500, workers=None):
+    """Claim a batch of jobs, recalculate their stats and remove them.
+
+    Returns a StatsReport, or None when the queue was empty. Jobs are only
+    removed once their stats are written, so a worker that dies part way
+    leaves them claimed for release_stale_stats_jobs to put back. This is
+    the stats worker, so workers defaults to settings.STATS_WORKERS.
+    """
+    if workers is None:
+        workers = settings.STATS_WORKERS
+    jobs = claim_stats_jobs(limit)
+    if not jobs:
+        return None
+
+    events_by_athlete = events_by_athlete_for(
+        (job.athlete_id, job.event_id) for job in jobs)
+    report = recompute_stats(events_by_athlete, workers=workers)
+    StatsJob.objects.filter(id__in=[job.id for job in jobs]).delete()
+    return report
+
+
+def release_stale_stats_jobs(seconds):
+    """Queue again any jobs claimed more than seconds ago by a worker that
+    never finished them. Returns the number of jobs released."""
+    cutoff = timezone.now() - timedelta(seconds=seconds)
+    stale = StatsJob.objects.filter(claimed__lt=cutoff)
+    groups = list(stale.values_list('athlete_id', 'event_id'))
+    if groups:
+        with transaction.atomic():
+            stale.delete()
+            enqueue_stats(groups)
+    return len(groups)
@@ -0,0 +1,112 @@
+from django.db.models import Case, F, FloatField, OuterRef, Q, Subquery, When
+
+from .models import PersonalBest, Result
+
+LEADERBOARD_PAGE_SIZE = 50
+
+
+def leaderboard(event, gender=None, season=None, team=None, after=None,
+                size=LEADERBOARD_PAGE_SIZE):
+    """A page of an event's leaderboard, one best mark per athlete.
+
+    Hand times are compared by their FAT adjusted value, and jumps and
+    throws put the biggest mark first. Without a season it ranks all-time
+    bests, with one it ranks bests of that season. team ranks each
+    athlete's best of the marks made at that team's meets.
+
+    Pages are read with a keyset rather than an offset: ``after`` is the
+    cursor of the previous page, so every page is a range scan of the
+    same index. Returns the results, each with its adjusted_value, and
+    the cursor for the next page, None on the last page.
+    """
+    if team:
+        entries = team_bests(event, season, team)
+    else:
+        # Each athlete is a single PersonalBest row already
+        entries = PersonalBest.objects.filter(
+            event=event, season=season
+        ).select_related(
+            'result__athlete', 'result__event'
+        )
+    if gender:
+        entries = entries.filter(athlete__gender=gender)
+
+    if event.unit == 'inches':
+        ordering = ('-adjusted_value', 'id')
+        beyond = 'adjusted_value__lt'
+    else:
+        ordering = ('adjusted_value', 'id')
+        beyond = 'adjusted_value__gt'
+
+    if after:
+        value, entry_id = after
+        entries = entries.filter(
+            Q(**{beyond: value}) | Q(adjusted_value=value, id__gt=entry_id))
+
+    page = list(entries.order_by(*ordering)[:size + 1])
+
+    next_cursor = None
+    if len(page) > size:
+        page = page[:size]
+        next_cursor = encode_cursor(page[-1])
+
+    if not team:
+        for personal_best in page:
+            personal_best.result.adjusted_value = personal_best.adjusted_value
+        page = [personal_best.result for personal_best in page]
+    return page, next_cursor
+
+
+def adjusted_mark(unit):
+    """fat_adjusted as a database expression on Result."""
+    if unit == 'inches':
+        return F('result')
+    return Case(
+        When(method='Hand', result__gt=180.0, then=F('result') + 0.14),
+        When(method='Hand', then=F('result') + 0.24),
+        default=F('result'),
+        output_field=FloatField(),
+    )
+
+
+def team_bests(event, season, team):
+    """Each athlete's best result in event at team's meets, annotated with
+    its adjusted_value.
+
+    Ties go the same way as personal_rank: the smaller raw time, then the
+    earlier entry.
+    """
+    results = Result.objects.filter(event=event, meet__team=team)
+    if season:
+        results = results.filter(meet__season=season)
+    results = results.annotate(adjusted_value=adjusted_mark(event.unit))
+
+    if event.unit == 'inches':
+        best_first = ('-adjusted_value', 'id')
+    else:
+        best_first = ('adjusted_value', 'result', 'id')
+    best = results.filter(
+        athlete=OuterRef('athlete')
+    ).order_by(
+        *best_first
+    ).values('id')[:1]
+
+    return results.filter(
+        id=Subquery(best)
+    ).select_related(
+        'athlete', 'event'
+    )
+
+
+def encode_cursor(entry):
+    # repr gives back the exact float
+    return f"{entry.adjusted_value!r}_{entry.id}"
+
+
+def decode_cursor(text):
+    """(adjusted value, id) from a cursor, or None if it isn't one."""
+    try:
+        value, entry_id = text.split('_')
+        return float(value), int(entry_id)
+    except (AttributeError, ValueError):
+        return None
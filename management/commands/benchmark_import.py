@@ -0,0 +1,98 @@
+import csv
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from openpyxl import Workbook
+
+from trackapp.importers import import_performances, read_rows
+from trackapp.management.commands.benchmark_stats import BENCHMARK_EVENTS
+from trackapp.models import *
+
+HEADERS = ['First Name', 'Last Name', 'Event', 'Meet', 'Date', 'Performance', 'FAT / Hand']
+
+
+def benchmark_rows(num_rows, seed=0):
+    """Spreadsheet rows for 200 athletes over a season of meets"""
+    rng = random.Random(seed)
+    meets = [
+        (f"Benchmark Meet {x}", datetime.datetime(2022, 1, 5) + datetime.timedelta(days=4 * x))
+        for x in range(30)
+    ]
+    for x in range(num_rows):
+        name, unit, base = rng.choice(BENCHMARK_EVENTS)
+        meet, date = rng.choice(meets)
+        mark = round(base * rng.uniform(0.9, 1.15), 2)
+        if unit == 'inches':
+            feet, inches = divmod(mark, 12)
+            mark = f"{int(feet)}-{inches:05.2f}"
+        elif mark >= 60:
+            minutes, seconds = divmod(mark, 60)
+            mark = f"{int(minutes)}:{seconds:05.2f}"
+        athlete = rng.randrange(200)
+        yield [
+            f"Bench{athlete}", f"Athlete{athlete}", name, meet, date, mark,
+            rng.choice(['FAT', 'HT', 'NA']),
+        ]
+
+
+def write_xlsx(path, rows):
+    wb = Workbook(write_only=True)
+    sheet = wb.create_sheet()
+    sheet.append(HEADERS)
+    for row in rows:
+        sheet.append(row)
+    wb.save(path)
+
+
+def write_csv(path, rows, delimiter=','):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter=delimiter)
+        writer.writerow(HEADERS)
+        for row in rows:
+            writer.writerow([
+                value.strftime('%Y-%m-%d') if isinstance(value, datetime.datetime) else value
+                for value in row
+            ])
+
+
+class Command(BaseCommand):
+    help = "Compare xlsx, CSV and TSV import throughput in rows per second"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        num_rows = options['rows']
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            for name, write in [
+                ('xlsx', write_xlsx),
+                ('csv', write_csv),
+                ('tsv', lambda path, rows: write_csv(path, rows, '\t')),
+            ]:
+                paths[name] = os.path.join(directory, f"benchmark.{name}")
+                write(paths[name], benchmark_rows(num_rows))
+
+            for name, path in paths.items():
+                start = time.perf_counter()
+                for row in read_rows(path):
+                    pass
+                read_seconds = time.perf_counter() - start
+
+                # Each import runs in a transaction that is rolled back
+                with transaction.atomic():
+                    team = Team.objects.create(name="Benchmark Team")
+                    season = Season.objects.create(name="Benchmark Season")
+                    start = time.perf_counter()
+                    import_performances(path, team, season, 'female')
+                    import_seconds = time.perf_counter() - start
+                    transaction.set_rollback(True)
+
+                self.stdout.write(
+                    f"{name:>5}: read {num_rows / read_seconds:9.0f} rows/s, "
+                    f"import {num_rows / import_seconds:8.0f} rows/s")
@@ -0,0 +1,79 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trackapp.marks import parse_mark_string, parse_marks
+
+def legacy_parse_mark(performance):
+    """The per-row parsing the importers used before marks.py"""
+    if isinstance(performance, str):
+        performance = performance.replace('..', '.')
+        if "-" in performance:
+            feet, inches = performance.split("-")
+            return (12.0 * float(feet)) + float(inches)
+        elif ':' in performance:
+            performance = performance.replace(',', '.')
+            if '.' not in performance:
+                performance += '.0'
+            pt = datetime.datetime.strptime(performance, '%M:%S.%f')
+            return pt.second + pt.minute*60.0 + pt.hour*3600.0 + (pt.microsecond/1000000.0)
+    return float(performance)
+
+
+def legacy_parse_marks(values):
+    marks = []
+    for value in values:
+        try:
+            marks.append(legacy_parse_mark(value))
+        except (TypeError, ValueError):
+            marks.append(None)
+    return marks
+
+
+def benchmark_values(count, seed=0):
+    """A season's worth of raw cells, as strings like a CSV export"""
+    rng = random.Random(seed)
+    values = []
+    for x in range(count):
+        kind = rng.random()
+        if kind < 0.4:
+            values.append(f"{rng.uniform(7, 60):.2f}")
+        elif kind < 0.7:
+            values.append(f"{rng.randint(1, 12)}:{rng.uniform(0, 59.99):05.2f}")
+        else:
+            values.append(f"{rng.randint(3, 50)}-{rng.uniform(0, 11.99):05.2f}")
+    return values
+
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return value, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = "Compare parse_marks against per-row parsing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--marks', type=int, default=200000)
+
+    def handle(self, *args, **options):
+        values = benchmark_values(options['marks'])
+        legacy, legacy_time = timed(lambda: legacy_parse_marks(values))
+        parse_mark_string.cache_clear()
+        cold, cold_time = timed(lambda: parse_marks(values))
+        warm, warm_time = timed(lambda: parse_marks(values))
+        if not (legacy == cold == warm):
+            raise CommandError("parse_marks doesn't match the per-row parser")
+
+        count = len(values)
+        for name, elapsed in [
+            ('per-row', legacy_time),
+            ('parse_marks', cold_time),
+            ('cached', warm_time),
+        ]:
+            self.stdout.write(
+                f"{name:>12}: {elapsed * 1000:8.1f} ms "
+                f"({count / elapsed / 1e6:.2f}M marks/s)")
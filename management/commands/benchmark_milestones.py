@@ -0,0 +1,92 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from trackapp.milestones import EVENT_MILESTONES, get_milestone_table
+from trackapp.models import Event, Result
+
+
+def legacy_milestone_num(result):
+    """The linear scan Result.milestone_num did before tables were compiled"""
+    milestones = EVENT_MILESTONES.get(result.event.name)
+    if not milestones:
+        return None
+
+    for x, milestone in enumerate(milestones):
+        if result.event.unit == "inches":
+            if result.result >= milestone:
+                return x
+        elif result.event.unit == 'seconds':
+            if result.result < milestone:
+                return x
+    return None
+
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return value, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = "Compare milestone lookups against the old linear Result.milestone_num"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--marks', type=int, default=200000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+
+        # Events are rolled back at the end
+        with transaction.atomic():
+            events = []
+            for name, milestones in EVENT_MILESTONES.items():
+                if not milestones:
+                    continue
+                descending = milestones[0] > milestones[-1]
+                unit = 'inches' if descending else 'seconds'
+                events.append(Event.objects.create(name=name, unit=unit))
+
+            results = []
+            for x in range(options['marks']):
+                event = rng.choice(events)
+                milestones = EVENT_MILESTONES[event.name]
+                low, high = min(milestones), max(milestones)
+                spread = (high - low) * 0.2 + 1
+                results.append(Result(
+                    event=event, result=rng.uniform(low - spread, high + spread)))
+
+            by_event = {}
+            for result in results:
+                by_event.setdefault(result.event, []).append(result.result)
+
+            legacy, legacy_time = timed(
+                lambda: [legacy_milestone_num(result) for result in results])
+            prop, prop_time = timed(
+                lambda: [result.milestone_num for result in results])
+            batches, batch_time = timed(lambda: {
+                event: get_milestone_table(event.name, event.unit).lookup_many(marks)
+                for event, marks in by_event.items()
+            })
+
+            transaction.set_rollback(True)
+
+        batch_nums = {}
+        for event, milestones in batches.items():
+            batch_nums[event] = iter(
+                milestone[0] if milestone else None for milestone in milestones)
+        batch = [next(batch_nums[result.event]) for result in results]
+        if not (legacy == prop == batch):
+            raise CommandError("Milestone lookups don't match the linear scan")
+
+        count = len(results)
+        for name, elapsed in [
+            ('linear scan', legacy_time),
+            ('milestone_num', prop_time),
+            ('lookup_many', batch_time),
+        ]:
+            self.stdout.write(
+                f"{name:>14}: {elapsed * 1000:8.1f} ms "
+                f"({count / elapsed / 1e6:.2f}M marks/s)")
@@ -0,0 +1,174 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from trackapp.models import *
+from trackapp.stats import calculate_result_stats
+
+
+def legacy_award(result, kind, **kwargs):
+    MilestoneAward.objects.create(
+        kind=kind, result=result, athlete_id=result.athlete_id,
+        event_id=result.event_id, date=result.meet.date, **kwargs)
+
+
+def legacy_calculate_result_stats(user):
+    """The per-row save() implementation the stats engine replaced"""
+    MilestoneAward.objects.filter(athlete=user).delete()
+    Result.qualifications.through.objects.filter(result__athlete=user).delete()
+
+    results_by_date = {}
+    for result in user.results.all().prefetch_related(
+        'event',
+        'meet'
+    ).order_by(
+        'meet__date'
+    ):
+        results_by_date.setdefault(result.event, []).append(result)
+
+    for event, results in results_by_date.items():
+        legacy_award(results[0], MilestoneAward.FIRST)
+
+    results_by_event = {}
+    for result in user.results.all().prefetch_related(
+        'event',
+        'meet',
+        'meet__season'
+    ).order_by(
+        'result',
+    ):
+        results_by_event.setdefault(result.event, []).append(result)
+
+    qualifying_qs = QualifyingLevel.objects.filter(gender=user.gender)
+    qualifying_level_dict = {}
+    for ql in qualifying_qs:
+        key = f"{ql.event_id}--{ql.season_id}"
+        qualifying_level_dict.setdefault(key, []).append(ql)
+
+    for event, results in results_by_event.items():
+        reverse = event.unit == 'inches'
+        for rank, result in enumerate(
+            sorted(results, key=lambda x: x.fat_adjusted_result, reverse=reverse)):
+
+            if rank == 0:
+                legacy_award(result, MilestoneAward.PERSONAL_BEST)
+
+            result.personal_rank = rank+1
+            result.save()
+
+            key = f"{result.event_id}--{result.meet.season_id}"
+            for ql in qualifying_level_dict.get(key, []):
+                if event.unit == 'inches':
+                    qualified = result.result >= ql.value
+                else:
+                    qualified = result.fat_adjusted_result <= ql.value
+                if qualified:
+                    result.qualifications.add(ql)
+                    legacy_award(result, MilestoneAward.QUALIFIED, qualifying_level=ql)
+
+        last_milestone_num = None
+        for result in sorted(results, key=lambda x: x.meet.date):
+            milestone_num = result.milestone_num
+            if milestone_num is None:
+                continue
+            if (last_milestone_num is None) or (milestone_num < last_milestone_num):
+                last_milestone_num = milestone_num
+                legacy_award(
+                    result, MilestoneAward.BROKE,
+                    value=result.get_milestone_value(milestone_num))
+
+
+BENCHMARK_EVENTS = [
+    ('400 Meters', 'seconds', 60.0),
+    ('1 Mile', 'seconds', 330.0),
+    ('55 Meters', 'seconds', 7.8),
+    ('Long Jump', 'inches', 200.0),
+    ('High Jump', 'inches', 62.0),
+    ('Shot Put', 'inches', 480.0),
+]
+
+
+def create_benchmark_athlete(num_results, seed=0):
+    """An athlete with num_results marks spread over four seasons"""
+    rng = random.Random(seed)
+    team = Team.objects.create(name="Benchmark Team")
+    seasons = [Season.objects.create(name=f"Benchmark {year}") for year in range(2019, 2023)]
+    meets = [
+        Meet.objects.create(
+            date=datetime.date(2019, 1, 5) + datetime.timedelta(days=4 * x),
+            description=f"Benchmark Meet {x}",
+            team=team,
+            season=seasons[x * len(seasons) // 100],
+        )
+        for x in range(100)
+    ]
+    events = []
+    for name, unit, base in BENCHMARK_EVENTS:
+        event = Event.objects.create(name=name, unit=unit)
+        events.append((event, base))
+        for season in seasons:
+            for description, factor in [('States', 0.97), ('Sectionals', 1.0), ('League', 1.03)]:
+                if unit == 'inches':
+                    factor = 2 - factor
+                QualifyingLevel.objects.create(
+                    description=description, event=event, season=season,
+                    gender='female', value=round(base * factor, 2))
+
+    user = User.objects.create(
+        username=f"benchmark.athlete.{seed}", first_name="Benchmark",
+        last_name="Athlete", gender='female')
+    Result.objects.bulk_create([
+        Result(
+            athlete=user,
+            event=event,
+            meet=rng.choice(meets),
+            result=round(base * rng.uniform(0.9, 1.15), 2),
+            method=rng.choice(['FAT', 'Hand', 'NA']),
+        )
+        for event, base in (rng.choice(events) for x in range(num_results))
+    ])
+    return user
+
+
+def measure(func, user):
+    # Start from unranked results so every run writes the full athlete
+    user.results.update(personal_rank=-1)
+    MilestoneAward.objects.filter(athlete=user).delete()
+    PersonalBest.objects.filter(athlete=user).delete()
+    Result.qualifications.through.objects.filter(result__athlete=user).delete()
+
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        func(user)
+        elapsed = time.perf_counter() - start
+    return len(queries), elapsed
+
+
+class Command(BaseCommand):
+    help = "Compare queries and wall time of the stats engine against per-row saves"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--results', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        # Everything runs in a transaction that is rolled back at the end
+        with transaction.atomic():
+            user = create_benchmark_athlete(options['results'])
+            self.stdout.write(f"Athlete with {user.results.count()} results")
+
+            for name, func in [
+                ('per-row save()', legacy_calculate_result_stats),
+                ('stats engine', calculate_result_stats),
+            ]:
+                runs = [measure(func, user) for x in range(options['repeat'])]
+                num_queries = max(run[0] for run in runs)
+                elapsed = min(run[1] for run in runs)
+                self.stdout.write(
+                    f"{name:>16}: {num_queries:6} queries {elapsed * 1000:9.1f} ms")
+
+            transaction.set_rollback(True)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trackapp.importers import find_import_files, import_files
+from trackapp.models import GENDER_CHOICES, Season, Team
+
+
+class Command(BaseCommand):
+    help = "Import every sheet of every performance file in a directory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--team', type=int, required=True, help="Team id")
+        parser.add_argument('--season', type=int, required=True, help="Season id")
+        parser.add_argument(
+            '--gender', required=True,
+            choices=[gender for gender, label in GENDER_CHOICES],
+            help="Gender of athletes created by the import")
+        parser.add_argument(
+            '--workers', type=int,
+            help="Processes parsing sheets, defaults to the CPU count")
+
+    def handle(self, *args, **options):
+        try:
+            team = Team.objects.get(id=options['team'])
+        except Team.DoesNotExist:
+            raise CommandError(f"Unknown team {options['team']}")
+        try:
+            season = Season.objects.get(id=options['season'])
+        except Season.DoesNotExist:
+            raise CommandError(f"Unknown season {options['season']}")
+
+        paths = find_import_files(options['directory'])
+        if not paths:
+            raise CommandError(f"No xlsx, CSV or TSV files in {options['directory']}")
+
+        self.stdout.write(f"Importing {len(paths)} files")
+        report = import_files(
+            paths, team, season, options['gender'], workers=options['workers'])
+        self.stdout.write(str(report))
@@ -0,0 +1,59 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trackapp.importers import continue_import, import_performances
+from trackapp.models import GENDER_CHOICES, ImportRun, Season, Team
+
+
+class Command(BaseCommand):
+    help = "Import a performance spreadsheet a chunk of rows at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', help="xlsx, CSV or TSV file")
+        parser.add_argument('--team', type=int, help="Team id")
+        parser.add_argument('--season', type=int, help="Season id")
+        parser.add_argument(
+            '--gender', choices=[gender for gender, label in GENDER_CHOICES],
+            help="Gender of athletes created by the import")
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.IMPORT_CHUNK_SIZE,
+            help="Rows committed at a time")
+        parser.add_argument(
+            '--resume', type=int, metavar='RUN',
+            help="Carry on an import run that stopped, from its last committed chunk "
+                 "(an upload needs its file given again)")
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                run = ImportRun.objects.get(id=options['resume'])
+            except ImportRun.DoesNotExist:
+                raise CommandError(f"Unknown import run {options['resume']}")
+            if run.finished:
+                raise CommandError(f"Import run {run.id} has already finished")
+            # Uploads only record the file name, not where the file is
+            data_file = options['file'] or run.name
+            if not os.path.isfile(data_file):
+                raise CommandError(f"{data_file} not found, pass the file to resume run {run.id}")
+            self.stdout.write(f"Resuming {run}")
+            run = continue_import(run, data_file)
+        else:
+            if not (options['file'] and options['team'] and options['season'] and options['gender']):
+                raise CommandError("A file, --team, --season and --gender are needed")
+            if options['chunk_size'] < 1:
+                raise CommandError("--chunk-size must be at least 1")
+            try:
+                team = Team.objects.get(id=options['team'])
+            except Team.DoesNotExist:
+                raise CommandError(f"Unknown team {options['team']}")
+            try:
+                season = Season.objects.get(id=options['season'])
+            except Season.DoesNotExist:
+                raise CommandError(f"Unknown season {options['season']}")
+            run = import_performances(
+                options['file'], team, season, options['gender'],
+                chunk_size=options['chunk_size'])
+
+        self.stdout.write(f"Import run {run.id}: {run.results} results from {run.rows_done} rows")
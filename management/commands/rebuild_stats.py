@@ -0,0 +1,204 @@
+import time
+
+import numpy as np
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from trackapp.milestones import get_milestone_table
+from trackapp.models import *
+from trackapp.qualifying import get_qualifying_index
+from trackapp.stats import ResultStats, load_stat_rows, stats_written, write_stats
+
+
+def group_starts(*keys):
+    """For rows sorted by keys, where each group starts and each row's start.
+
+    Returns (starts, new_group): the index of the first row of every row's
+    group, and a mask that is set on the first row of each group.
+    """
+    num_rows = len(keys[0])
+    new_group = np.zeros(num_rows, dtype=bool)
+    new_group[:1] = True
+    for key in keys:
+        new_group[1:] |= key[1:] != key[:-1]
+    starts = np.maximum.accumulate(np.where(new_group, np.arange(num_rows), 0))
+    return starts, new_group
+
+
+def milestone_nums(event_ids, marks, events):
+    """Milestone index reached by each mark, or -1 where there isn't one.
+
+    ``events`` maps event id to (name, unit).
+    """
+    nums = np.full(len(marks), -1, dtype=np.int64)
+    for event_id, (name, unit) in events.items():
+        table = get_milestone_table(name, unit)
+        if not table:
+            continue
+
+        mask = event_ids == event_id
+        event_marks = marks[mask]
+        count = len(table.values)
+        reached = np.searchsorted(np.asarray(table.values, dtype=float), event_marks, side='right')
+        if table.direction == 'under':
+            event_nums = np.where(reached < count, reached, -1)
+        elif table.direction == 'over':
+            event_nums = np.where(reached > 0, count - reached, -1)
+        else:
+            event_nums = [table.lookup(mark) for mark in event_marks]
+            event_nums = [-1 if num is None else num[0] for num in event_nums]
+        nums[mask] = event_nums
+    return nums
+
+
+def compute_stats_vectorized(rows, genders, index):
+    """Vectorized equivalent of stats.compute_stats for many athletes.
+
+    ``genders`` maps athlete id to gender and ``index`` is a
+    QualifyingIndex. Returns the same dict of result id to ResultStats.
+    """
+    num_rows = len(rows)
+    if not num_rows:
+        return {}
+
+    ids = np.fromiter((row.id for row in rows), np.int64, num_rows)
+    athletes = np.fromiter((row.athlete_id for row in rows), np.int64, num_rows)
+    events = np.fromiter((row.event_id for row in rows), np.int64, num_rows)
+    seasons = np.fromiter((row.season_id for row in rows), np.int64, num_rows)
+    dates = np.fromiter((row.date.toordinal() for row in rows), np.int64, num_rows)
+    marks = np.fromiter((row.result for row in rows), float, num_rows)
+    inches = np.fromiter((row.unit == 'inches' for row in rows), bool, num_rows)
+    hand = np.fromiter((row.method == 'Hand' for row in rows), bool, num_rows)
+
+    # Same as fat_adjusted
+    adjusted = np.where(
+        inches | ~hand,
+        marks,
+        np.where(marks > 180.0, marks + 0.14, marks + 0.24))
+
+    # First time in each event
+    order = np.lexsort((ids, dates, events, athletes))
+    starts, new_group = group_starts(athletes[order], events[order])
+    first = np.zeros(num_rows, dtype=bool)
+    first[order[new_group]] = True
+
+    # Rank by adjusted mark, ties go to the smaller raw mark then the
+    # earlier entry (jumps and throws rank the biggest mark first)
+    order = np.lexsort((
+        ids,
+        np.where(inches, 0.0, marks),
+        np.where(inches, -marks, adjusted),
+        events,
+        athletes,
+    ))
+    starts, new_group = group_starts(athletes[order], events[order])
+    ranks = np.empty(num_rows, dtype=np.int64)
+    ranks[order] = np.arange(num_rows) - starts + 1
+
+    # A milestone is broken when a mark reaches a better (lower) milestone
+    # than any earlier mark in the event. Offsetting each group by a
+    # multiple of a constant larger than any milestone index turns that
+    # into a single running minimum over all groups.
+    order = np.lexsort((ids, marks, dates, events, athletes))
+    starts, new_group = group_starts(athletes[order], events[order])
+    event_names = {row.event_id: (row.event_name, row.unit) for row in rows}
+    nums = milestone_nums(events[order], marks[order], event_names)
+    no_milestone = nums.max() + 1
+    offset = no_milestone + 1
+    shifted = np.where(nums >= 0, nums, no_milestone) - (np.cumsum(new_group) * offset)
+    previous = np.empty(num_rows, dtype=np.int64)
+    previous[1:] = np.minimum.accumulate(shifted)[:-1]
+    previous[new_group] = np.iinfo(np.int64).max
+    broke = np.full(num_rows, -1, dtype=np.int64)
+    broken = (nums >= 0) & (shifted < previous)
+    broke[order[broken]] = nums[broken]
+
+    # Qualifying levels are matched a (gender, event, season) group at a time
+    gender_codes = {gender: code for code, (gender, label) in enumerate(GENDER_CHOICES)}
+    gender_list = [gender for gender, label in GENDER_CHOICES]
+    row_genders = np.fromiter(
+        (gender_codes.get(genders[row.athlete_id], -1) for row in rows), np.int64, num_rows)
+    qualifications = {}
+    order = np.lexsort((seasons, events, row_genders))
+    starts, new_group = group_starts(row_genders[order], events[order], seasons[order])
+    bounds = list(np.flatnonzero(new_group)) + [num_rows]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        group = order[start:end]
+        first_row = group[0]
+        if row_genders[first_row] < 0:
+            continue
+        for ql in index.levels_for(
+                int(events[first_row]),
+                int(seasons[first_row]),
+                gender_list[row_genders[first_row]]):
+            qualified = np.where(
+                inches[group], marks[group] >= ql.value, adjusted[group] <= ql.value)
+            for row_index in group[qualified]:
+                qualifications.setdefault(int(row_index), []).append(ql.id)
+
+    stats = {}
+    for position, row in enumerate(rows):
+        awards = []
+        if first[position]:
+            awards.append((MilestoneAward.FIRST, None, None))
+        if ranks[position] == 1:
+            awards.append((MilestoneAward.PERSONAL_BEST, None, None))
+        row_qualifications = qualifications.get(position, [])
+        awards.extend(
+            (MilestoneAward.QUALIFIED, ql_id, None) for ql_id in row_qualifications)
+        if broke[position] >= 0:
+            value = get_milestone_table(row.event_name, row.unit).milestones[broke[position]]
+            awards.append((MilestoneAward.BROKE, None, value))
+
+        stats[row.id] = ResultStats(int(ranks[position]), awards, row_qualifications)
+    return stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild result stats for every athlete on a team and/or in a season"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--team', type=int, help="Team id")
+        parser.add_argument('--season', type=int, help="Season id")
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help="Athletes to load and write at a time")
+
+    def handle(self, *args, **options):
+        results = Result.objects.all()
+        if options['team']:
+            if not Team.objects.filter(id=options['team']).exists():
+                raise CommandError(f"Unknown team {options['team']}")
+            results = results.filter(meet__team_id=options['team'])
+        if options['season']:
+            if not Season.objects.filter(id=options['season']).exists():
+                raise CommandError(f"Unknown season {options['season']}")
+            results = results.filter(meet__season_id=options['season'])
+
+        # Ranks and milestones cover an athlete's whole career, so every
+        # result of the matching athletes is rebuilt
+        athlete_ids = sorted(set(results.values_list('athlete_id', flat=True)))
+        genders = dict(User.objects.filter(
+            id__in=athlete_ids).values_list('id', 'gender'))
+        index = get_qualifying_index()
+
+        start = time.perf_counter()
+        total = 0
+        meet_ids = set()
+        chunk_size = options['chunk_size']
+        for x in range(0, len(athlete_ids), chunk_size):
+            chunk_results = Result.objects.filter(
+                athlete_id__in=athlete_ids[x:x + chunk_size])
+            rows = load_stat_rows(chunk_results)
+            stats = compute_stats_vectorized(rows, genders, index)
+            with transaction.atomic():
+                write_stats(rows, stats, chunk_results)
+            total += len(rows)
+            meet_ids.update(row.meet_id for row in rows)
+        stats_written(athlete_ids, meet_ids)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Rebuilt {total} results for {len(athlete_ids)} athletes "
+            f"in {elapsed:.1f}s")
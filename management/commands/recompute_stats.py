@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from trackapp.models import Result
+from trackapp.stats import recompute_stats
+
+
+class Command(BaseCommand):
+    help = "Recalculate result stats for athletes on a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'athlete_ids', nargs='*', type=int,
+            help="Athletes to recalculate, defaults to everyone with results")
+        parser.add_argument(
+            '--workers', type=int,
+            help="Worker processes, defaults to settings.STATS_WORKERS")
+        parser.add_argument('--chunk-size', type=int, default=25)
+
+    def handle(self, *args, **options):
+        athlete_ids = options['athlete_ids'] or set(
+            Result.objects.values_list('athlete_id', flat=True))
+
+        report = recompute_stats(
+            dict.fromkeys(athlete_ids),
+            workers=options['workers'] or settings.STATS_WORKERS,
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(str(report))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from trackapp.jobs import release_stale_stats_jobs, run_stats_jobs
+
+
+class Command(BaseCommand):
+    help = "Recalculate stats for queued jobs until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit once the queue is empty")
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Jobs to claim at a time")
+        parser.add_argument(
+            '--sleep', type=float, default=2.0,
+            help="Seconds to wait when the queue is empty")
+        parser.add_argument(
+            '--stale', type=int, default=600,
+            help="Seconds after which another worker's claimed jobs are queued again")
+        parser.add_argument(
+            '--workers', type=int,
+            help="Worker processes, defaults to settings.STATS_WORKERS")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                released = release_stale_stats_jobs(options['stale'])
+                if released:
+                    self.stdout.write(f"Released {released} stale jobs")
+
+                report = run_stats_jobs(options['batch_size'], options['workers'])
+                if report:
+                    self.stdout.write(str(report))
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
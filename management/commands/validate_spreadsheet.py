@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trackapp.importers import event_units
+from trackapp.models import Season
+from trackapp.validation import validate_files
+
+
+class Command(BaseCommand):
+    help = "Check performance spreadsheets for problems without importing them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help="xlsx, CSV or TSV files")
+        parser.add_argument(
+            '--season', type=int,
+            help="Season id, gives the year for dates written without one")
+        parser.add_argument(
+            '--workers', type=int,
+            help="Worker processes, defaults to one per file up to the CPU count")
+
+    def handle(self, *args, **options):
+        season = None
+        if options['season']:
+            try:
+                season = Season.objects.get(id=options['season'])
+            except Season.DoesNotExist:
+                raise CommandError(f"Unknown season {options['season']}")
+
+        reports = validate_files(
+            options['files'], season, event_units(), options['workers'])
+        for report in reports:
+            self.stdout.write(str(report))
+
+        failed = sum(1 for report in reports if not report.ok)
+        if failed:
+            raise CommandError(f"{failed} of {len(reports)} files have problems")
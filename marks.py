@@ -0,0 +1,117 @@
+import datetime
+import functools
+import re
+
+# Marks that mean there was no valid attempt
+NO_MARKS = {
+    '', 'NA', 'N/A', 'DNF', 'DNS', 'DQ', 'DSQ', 'FOUL', 'FS', 'NH', 'NM',
+    'NT', 'SCR', 'X', '-', '--',
+}
+
+FRACTIONS = {'½': '.5', '¼': '.25', '¾': '.75', ' 1/2': '.5', ' 1/4': '.25', ' 3/4': '.75'}
+
+# 1:05:12.34, 4:32.1, 4:32,1, 4:32 (hours and fraction optional)
+CLOCK = re.compile(r"(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[.,](\d*))?")
+
+# 14-11, 14-11.25, 14 - 11, 14'11", 14' 11.5'', 14ft 11in
+FEET_INCHES = re.compile(
+    r"(\d+)\s*(?:-|'|ft\.?)\s*(\d+(?:\.\d*)?)?\s*(?:\"|''|in\.?)?")
+
+# 12.34, 12.34h, 12.34 (+1.2), 5.20m
+NUMBER = re.compile(r"(\d+(?:\.\d*)?|\.\d+)\s*(m|h)?(?:\s*\(.*\))?", re.IGNORECASE)
+
+INCHES_PER_METER = 39.37007874015748
+
+
+def parse_mark(value, unit=None):
+    """A mark in seconds or inches, or None if value isn't a valid mark.
+
+    Takes the cells found in spreadsheets: numbers, strings such as
+    "4:32.10" or "14-11" and times that Excel turned into a time of day.
+    With a unit, marks written in the other unit's style are rejected.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return parse_mark_string(value, unit)
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (datetime.time, datetime.datetime)):
+        return (value.hour * 3600 + value.minute * 60) + value.second + (value.microsecond / 1000000.0)
+    return None
+
+
+def is_no_mark(value):
+    """Whether a cell is empty or says there was no valid attempt."""
+    return value is None or (isinstance(value, str) and value.strip().upper() in NO_MARKS)
+
+
+def parse_marks(values, unit=None):
+    """parse_mark for a whole column of cells in one call."""
+    marks = []
+    for value in values:
+        if type(value) is float:
+            marks.append(value)
+        elif type(value) is str:
+            marks.append(parse_mark_string(value, unit))
+        else:
+            marks.append(parse_mark(value, unit))
+    return marks
+
+
+def parse_marks_by_unit(values, units):
+    """parse_marks for cells of different units, one call per unit."""
+    indexes_by_unit = {}
+    for index, unit in enumerate(units):
+        indexes_by_unit.setdefault(unit, []).append(index)
+
+    marks = [None] * len(values)
+    for unit, indexes in indexes_by_unit.items():
+        for index, mark in zip(indexes, parse_marks([values[index] for index in indexes], unit)):
+            marks[index] = mark
+    return marks
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_mark_string(text, unit=None):
+    # Fix common mistakes:
+    text = text.strip().replace('..', '.')
+    if text.upper() in NO_MARKS:
+        return None
+
+    if ':' in text:
+        if unit == 'inches':
+            return None
+        match = CLOCK.fullmatch(text)
+        if not match:
+            return None
+        hours, minutes, seconds, fraction = match.groups()
+        if int(seconds) > 59 or (hours and int(minutes) > 59):
+            return None
+        # Summed in the same order as the strptime based parser this
+        # replaced, so marks already imported compare equal
+        microseconds = int((fraction or '0')[:6].ljust(6, '0'))
+        return int(seconds) + int(minutes) * 60.0 + int(hours or 0) * 3600.0 + (microseconds / 1000000.0)
+
+    for fraction, decimal in FRACTIONS.items():
+        text = text.replace(fraction, decimal)
+
+    match = FEET_INCHES.fullmatch(text)
+    if match:
+        if unit == 'seconds':
+            return None
+        feet, inches = match.groups()
+        return (12.0 * float(feet)) + float(inches or 0)
+
+    match = NUMBER.fullmatch(text)
+    if match:
+        number, suffix = match.groups()
+        if suffix and suffix.lower() == 'm':
+            if unit == 'seconds':
+                return None
+            return round(float(number) * INCHES_PER_METER, 2)
+        return float(number)
+
+    return None
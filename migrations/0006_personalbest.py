@@ -0,0 +1,92 @@
+# Generated by Django 3.2.5 on 2026-10-17 00:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_personal_bests(apps, schema_editor):
+    """Work out the best result overall and per season for every athlete"""
+    Result = apps.get_model('trackapp', 'Result')
+    PersonalBest = apps.get_model('trackapp', 'PersonalBest')
+
+    best = {}
+    for values in Result.objects.values_list(
+            'id', 'athlete_id', 'event_id', 'meet__season_id', 'meet__date',
+            'result', 'method', 'event__unit').iterator():
+        result_id, athlete_id, event_id, season_id, date, value, method, unit = values
+        adjusted = value
+        if unit != 'inches' and method == 'Hand':
+            adjusted += 0.14 if value > 180.0 else 0.24
+
+        if unit == 'inches':
+            rank_key = (-value, result_id)
+        else:
+            rank_key = (adjusted, value, result_id)
+
+        for key in [(athlete_id, event_id, None), (athlete_id, event_id, season_id)]:
+            if key not in best or rank_key < best[key][0]:
+                best[key] = (rank_key, result_id, value, adjusted, date)
+
+    PersonalBest.objects.bulk_create([
+        PersonalBest(
+            athlete_id=athlete_id,
+            event_id=event_id,
+            season_id=season_id,
+            result_id=result_id,
+            value=value,
+            adjusted_value=adjusted,
+            date=date,
+        )
+        for (athlete_id, event_id, season_id), (rank_key, result_id, value, adjusted, date)
+        in best.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackapp', '0005_user_gender'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='meet',
+            options={'ordering': ['-date', 'description']},
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='unit',
+            field=models.CharField(choices=[('inches', 'Inches'), ('seconds', 'Seconds')], default='seconds', max_length=100),
+        ),
+        migrations.CreateModel(
+            name='PersonalBest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.FloatField()),
+                ('adjusted_value', models.FloatField()),
+                ('date', models.DateField()),
+                ('athlete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_bests', to=settings.AUTH_USER_MODEL)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_bests', to='trackapp.event')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_bests', to='trackapp.result')),
+                ('season', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='personal_bests', to='trackapp.season')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='personalbest',
+            index=models.Index(fields=['event', 'season', 'adjusted_value'], name='trackapp_pe_event_i_6333c6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personalbest',
+            index=models.Index(fields=['season', 'date'], name='trackapp_pe_season__ad4f83_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='personalbest',
+            constraint=models.UniqueConstraint(fields=('athlete', 'event', 'season'), name='unique_season_personal_best'),
+        ),
+        migrations.AddConstraint(
+            model_name='personalbest',
+            constraint=models.UniqueConstraint(condition=models.Q(('season', None)), fields=('athlete', 'event'), name='unique_personal_best'),
+        ),
+        migrations.RunPython(fill_personal_bests, migrations.RunPython.noop),
+    ]
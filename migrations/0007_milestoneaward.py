@@ -0,0 +1,91 @@
+# Generated by Django 3.2.5 on 2026-10-17 00:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+
+FIRST, PERSONAL_BEST, QUALIFIED, BROKE = 1, 2, 3, 4
+
+BROKE_PATTERN = re.compile(r"Broke (\d+)[:'](\d+\.\d+)\.")
+
+
+def fill_milestone_awards(apps, schema_editor):
+    """Turn the milestones text of every result into MilestoneAward rows.
+
+    Personal bests and qualifications come from personal_rank and the
+    qualifications table, which the text was written from.
+    """
+    Result = apps.get_model('trackapp', 'Result')
+    MilestoneAward = apps.get_model('trackapp', 'MilestoneAward')
+
+    qualifications = {}
+    for result_id, ql_id in Result.qualifications.through.objects.order_by(
+            'qualifyinglevel_id').values_list('result_id', 'qualifyinglevel_id'):
+        qualifications.setdefault(result_id, []).append(ql_id)
+
+    awards = []
+    for values in Result.objects.values_list(
+            'id', 'athlete_id', 'event_id', 'meet__date', 'event__unit',
+            'personal_rank', 'milestones').iterator():
+        result_id, athlete_id, event_id, date, unit, personal_rank, text = values
+        text = text or ''
+
+        def award(kind, **kwargs):
+            awards.append(MilestoneAward(
+                kind=kind, result_id=result_id, athlete_id=athlete_id,
+                event_id=event_id, date=date, **kwargs))
+
+        if text.startswith('First time in the'):
+            award(FIRST)
+        if personal_rank == 1:
+            award(PERSONAL_BEST)
+        for ql_id in qualifications.get(result_id, []):
+            award(QUALIFIED, qualifying_level_id=ql_id)
+        match = BROKE_PATTERN.search(text)
+        if match:
+            whole, part = int(match.group(1)), float(match.group(2))
+            scale = 12 if unit == 'inches' else 60
+            award(BROKE, value=round(whole * scale + part, 2))
+
+    MilestoneAward.objects.bulk_create(awards, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackapp', '0006_personalbest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MilestoneAward',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.IntegerField(choices=[(1, 'First time'), (2, 'Personal best'), (3, 'Qualified'), (4, 'Broke milestone')])),
+                ('date', models.DateField()),
+                ('value', models.FloatField(blank=True, null=True)),
+                ('athlete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='milestone_awards', to=settings.AUTH_USER_MODEL)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='milestone_awards', to='trackapp.event')),
+                ('qualifying_level', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='milestone_awards', to='trackapp.qualifyinglevel')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='milestone_awards', to='trackapp.result')),
+            ],
+            options={
+                'ordering': ['kind', 'qualifying_level_id', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='milestoneaward',
+            index=models.Index(fields=['kind', 'date'], name='trackapp_mi_kind_ff4986_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='milestoneaward',
+            index=models.Index(fields=['athlete', 'event'], name='trackapp_mi_athlete_dda332_idx'),
+        ),
+        migrations.RunPython(fill_milestone_awards, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='result',
+            name='milestones',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.5 on 2026-10-17 00:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackapp', '0007_milestoneaward'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('claimed', models.DateTimeField(blank=True, null=True)),
+                ('athlete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_jobs', to=settings.AUTH_USER_MODEL)),
+                ('event', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stats_jobs', to='trackapp.event')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='statsjob',
+            index=models.Index(fields=['claimed', 'created'], name='trackapp_st_claimed_1b8627_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='statsjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('claimed', None)), fields=('athlete', 'event'), name='unique_pending_stats_job'),
+        ),
+        migrations.AddConstraint(
+            model_name='statsjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('claimed', None), ('event', None)), fields=('athlete',), name='unique_pending_athlete_stats_job'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.5 on 2026-10-17 00:54
+
+from django.db import migrations, models
+import hashlib
+
+
+def fill_fingerprints(apps, schema_editor):
+    """Fingerprint existing results, numbering the results for each athlete,
+    event and meet in the order they were saved."""
+    Result = apps.get_model('trackapp', 'Result')
+
+    occurrences = {}
+    results = []
+    for result_id, meet_id, event_id, athlete_id in Result.objects.order_by(
+            'id').values_list('id', 'meet_id', 'event_id', 'athlete_id').iterator():
+        key = f"{meet_id}:{event_id}:{athlete_id}"
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        fingerprint = hashlib.sha1(f"{key}:{occurrence}".encode()).hexdigest()
+        results.append(Result(id=result_id, fingerprint=fingerprint))
+    Result.objects.bulk_update(results, ['fingerprint'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackapp', '0008_statsjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True, unique=True),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+    ]
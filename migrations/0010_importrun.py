@@ -0,0 +1,31 @@
+# Generated by Django 3.2.5 on 2026-10-17 00:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackapp', '0009_result_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('gender', models.CharField(choices=[('male', 'Male'), ('female', 'Female')], max_length=255)),
+                ('chunk_size', models.IntegerField()),
+                ('rows_done', models.IntegerField(default=0)),
+                ('results', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('season', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_runs', to='trackapp.season')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_runs', to='trackapp.team')),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.5 on 2026-10-17 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackapp', '0010_importrun'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['event', 'result'], name='trackapp_re_event_i_79c118_idx'),
+        ),
+    ]
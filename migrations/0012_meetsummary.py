@@ -0,0 +1,73 @@
+# Generated by Django 3.2.5 on 2026-10-17 01:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+PERSONAL_BEST, QUALIFIED, BROKE = 2, 3, 4
+
+AWARD_COUNT_FIELDS = {
+    PERSONAL_BEST: 'personal_records',
+    QUALIFIED: 'qualifications',
+    BROKE: 'milestones',
+}
+
+
+def fill_meet_summaries(apps, schema_editor):
+    """Count every meet's results and awards, per event and in total."""
+    Result = apps.get_model('trackapp', 'Result')
+    MilestoneAward = apps.get_model('trackapp', 'MilestoneAward')
+    MeetSummary = apps.get_model('trackapp', 'MeetSummary')
+
+    awards = MilestoneAward.objects.filter(kind__in=AWARD_COUNT_FIELDS).order_by()
+    summaries = {}
+    for group in [('meet_id', 'event_id'), ('meet_id',)]:
+        for values in Result.objects.order_by().values(*group).annotate(
+                count=models.Count('id'),
+                athlete_count=models.Count('athlete_id', distinct=True)):
+            key = (values['meet_id'], values.get('event_id'))
+            summaries[key] = MeetSummary(
+                meet_id=key[0],
+                event_id=key[1],
+                results=values['count'],
+                athletes=values['athlete_count'],
+            )
+
+        award_group = ['result__meet_id', 'result__event_id'][:len(group)]
+        for values in awards.values(*award_group, 'kind').annotate(count=models.Count('id')):
+            key = (values['result__meet_id'], values.get('result__event_id'))
+            setattr(summaries[key], AWARD_COUNT_FIELDS[values['kind']], values['count'])
+
+    MeetSummary.objects.bulk_create(summaries.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackapp', '0011_result_event_result_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeetSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('results', models.IntegerField(default=0)),
+                ('athletes', models.IntegerField(default=0)),
+                ('personal_records', models.IntegerField(default=0)),
+                ('qualifications', models.IntegerField(default=0)),
+                ('milestones', models.IntegerField(default=0)),
+                ('event', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='meet_summaries', to='trackapp.event')),
+                ('meet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='trackapp.meet')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='meetsummary',
+            constraint=models.UniqueConstraint(fields=('meet', 'event'), name='unique_meet_event_summary'),
+        ),
+        migrations.AddConstraint(
+            model_name='meetsummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('event', None)), fields=('meet',), name='unique_meet_summary'),
+        ),
+        migrations.RunPython(fill_meet_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.5 on 2026-10-17 01:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+PERSONAL_BEST, BROKE = 2, 4
+
+
+def fill_recent_achievements(apps, schema_editor):
+    """Start the feed with the personal bests and milestones awarded now."""
+    MilestoneAward = apps.get_model('trackapp', 'MilestoneAward')
+    RecentAchievement = apps.get_model('trackapp', 'RecentAchievement')
+
+    RecentAchievement.objects.bulk_create([
+        RecentAchievement(
+            kind=award.kind,
+            result_id=award.result_id,
+            athlete_id=award.athlete_id,
+            event_id=award.event_id,
+            date=award.date,
+        )
+        for award in MilestoneAward.objects.filter(
+            kind__in=[PERSONAL_BEST, BROKE]).order_by('date', 'id').iterator()
+    ], batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackapp', '0012_meetsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecentAchievement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.IntegerField(choices=[(1, 'First time'), (2, 'Personal best'), (3, 'Qualified'), (4, 'Broke milestone')])),
+                ('date', models.DateField()),
+                ('athlete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recent_achievements', to=settings.AUTH_USER_MODEL)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recent_achievements', to='trackapp.event')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recent_achievements', to='trackapp.result')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recentachievement',
+            index=models.Index(fields=['date', 'id'], name='trackapp_re_date_1dacae_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recentachievement',
+            constraint=models.UniqueConstraint(fields=('result', 'kind'), name='unique_recent_achievement'),
+        ),
+        migrations.RunPython(fill_recent_achievements, migrations.RunPython.noop),
+    ]
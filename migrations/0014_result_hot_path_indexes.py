@@ -0,0 +1,29 @@
+# Generated by Django 3.2.5 on 2026-10-17 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackapp', '0013_recentachievement'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meet',
+            index=models.Index(fields=['-date', 'description'], name='trackapp_me_date_36a4c3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['athlete', 'event', 'result'], name='trackapp_re_athlete_b1197b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['meet', 'event', 'athlete', 'result'], name='trackapp_re_meet_id_b570a4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['last_name', 'first_name'], name='trackapp_us_last_na_d095ea_idx'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import bisect
+
 EVENT_MILESTONES = {
     '1 Mile': range(260, 480, 10),
     '100 Meters': [11, 12, 13, 14, 15, 16],
@@ -39,3 +41,77 @@ EVENT_MILESTONES = {
     'Triple Jump': range(516, 300, -60),
     'Triple Jump Relay': []
 }
+
+
+
+class MilestoneTable:
+    """An event's milestones compiled for bisect lookups.
+
+    Milestones are listed best first, so times count down and jumps and
+    throws count up. A mark reaches the first milestone it is under (times)
+    or at or over (jumps and throws).
+    """
+
+    def __init__(self, milestones, unit):
+        self.milestones = list(milestones)
+        self.unit = unit
+
+        pairs = list(zip(self.milestones, self.milestones[1:]))
+        if unit == 'seconds' and all(a <= b for a, b in pairs):
+            self.direction = 'under'
+            self.values = self.milestones
+        elif unit == 'inches' and all(a >= b for a, b in pairs):
+            self.direction = 'over'
+            self.values = self.milestones[::-1]
+        else:
+            # Listed in the wrong order for the unit, check them one by one
+            self.direction = None
+            self.values = self.milestones
+
+    def lookup(self, mark):
+        """(index, value) of the milestone a mark reached, or None."""
+        count = len(self.values)
+        if self.direction == 'under':
+            x = bisect.bisect_right(self.values, mark)
+            if x == count:
+                return None
+        elif self.direction == 'over':
+            x = count - bisect.bisect_right(self.values, mark)
+            if x == count:
+                return None
+        else:
+            for x, milestone in enumerate(self.milestones):
+                if (mark >= milestone if self.unit == 'inches' else mark < milestone):
+                    break
+            else:
+                return None
+        return x, self.milestones[x]
+
+    def lookup_many(self, marks):
+        """lookup for a batch of marks."""
+        if self.direction is None:
+            return [self.lookup(mark) for mark in marks]
+
+        values = self.values
+        milestones = self.milestones
+        count = len(values)
+        bisect_right = bisect.bisect_right
+        if self.direction == 'under':
+            reached = [bisect_right(values, mark) for mark in marks]
+        else:
+            reached = [count - bisect_right(values, mark) for mark in marks]
+        return [(x, milestones[x]) if x < count else None for x in reached]
+
+
+# Compiled once at import for both units, since the unit lives on the event
+MILESTONE_TABLES = {
+    (event_name, unit): MilestoneTable(milestones, unit)
+    for event_name, milestones in EVENT_MILESTONES.items()
+    if milestones
+    for unit in ('inches', 'seconds')
+}
+
+
+def get_milestone_table(event_name, unit):
+    return MILESTONE_TABLES.get((event_name, unit))
+
@@ -1,3 +1,4 @@
+import hashlib
 import time
 import math 
 
@@ -9,30 +10,56 @@ from django.db import models
 from django.db.models.fields import CharField, DateField, TextField, FloatField
 from django.db.models.fields.related import ForeignKey, ManyToManyField
 
-from .milestones import EVENT_MILESTONES
+from .milestones import get_milestone_table
 
 GENDER_CHOICES = [
     ('male', 'Male'),
     ('female', 'Female')
 ]
 
+
+def format_mark(value, unit):
+    if unit == "inches":
+        feet, inches = divmod(value, 12)
+        return f"{int(feet):02}'{inches:05.2f}"
+    elif unit == 'seconds':
+        minutes, seconds = divmod(value, 60)
+        return f"{int(minutes):02}:{seconds:05.2f}"
+    else:
+        return f"{value}"
+
+
+def fat_adjusted(value, method, unit):
+    """Convert a hand time to its FAT equivalent so marks can be compared"""
+    if unit == "inches":
+        return value
+
+    if method == 'Hand':
+        if value > 180.0:
+            return value + 0.14
+        else:
+            return value + 0.24
+
+    return value
+
+
 class User(AbstractUser):
     team = models.ManyToManyField("Team", related_name="team_members")
     gender = models.CharField(max_length=255, choices=GENDER_CHOICES, default='female')
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # The athlete list is sorted by name
+            models.Index(fields=['last_name', 'first_name']),
+        ]
+
     def get_prs(self):
-        prs = {}
-        for result in self.results.all():
-            if not result.event in prs:
-                prs[result.event] = result
-            else:
-                if result.event.unit == 'inches':
-                    if result.result > prs[result.event].result:
-                        prs[result.event] = result
-                else:
-                    if result.result < prs[result.event].result:
-                        prs[result.event] = result
-        return prs
+        personal_bests = self.personal_bests.filter(
+            season=None
+        ).select_related(
+            'event', 'result'
+        )
+        return {pb.event: pb.result for pb in personal_bests}
 
     def __str__(self):
         return f"{self.username} ({self.id})"
@@ -74,6 +101,10 @@ class Meet(models.Model):
 
     class Meta:
         ordering = ['-date', 'description']    
+        indexes = [
+            # The default ordering, the home page's latest meets
+            models.Index(fields=['-date', 'description']),
+        ]
 
     def __str__(self):
         return f"{self.description} ({self.id}): {self.date} ({ self.team.name })"
@@ -83,6 +114,18 @@ class Meet(models.Model):
 admin.site.register(Meet)
 
 
+def result_fingerprint(source, meet_id, event_id, athlete_id, occurrence):
+    """Identifies the spreadsheet row a result was imported from.
+
+    source names the file and sheet (see importers.import_source), and
+    occurrence counts the results before it in that sheet for the same
+    athlete, event and meet, so the fingerprint stays the same when the
+    mark is corrected.
+    """
+    key = f"{source}:{meet_id}:{event_id}:{athlete_id}:{occurrence}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
 class Result(models.Model):
     athlete = models.ForeignKey(User, on_delete=models.CASCADE, related_name='results')
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='results')
@@ -95,147 +138,266 @@ class Result(models.Model):
     ]
     method = CharField(max_length=100, default='NA')
     personal_rank = models.IntegerField(default=-1)
-    milestones = TextField(blank=True, null=True)
     qualifications = ManyToManyField('QualifyingLevel', related_name='qualifying_results')
+    # Set by the importers, see result_fingerprint
+    fingerprint = CharField(max_length=40, unique=True, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Range queries on the mark when qualifying levels change
+            models.Index(fields=['event', 'result']),
+            # An athlete's results in an event, for stats and profiles
+            models.Index(fields=['athlete', 'event', 'result']),
+            # A meet's results by event, for its page, its summaries and
+            # the duplicate check on import
+            models.Index(fields=['meet', 'event', 'athlete', 'result']),
+        ]
 
     def __str__(self):
         return f"{self.id}: {self.result}"
 
     @property
     def formatted_result(self):
-        if self.event.unit == "inches":
-            feet, inches = divmod(self.result, 12)
-            return f"{int(feet):02}'{inches:05.2f}"
-        elif self.event.unit == 'seconds':
-            minutes, seconds = divmod(self.result, 60)
-            return f"{int(minutes):02}:{seconds:05.2f}"
-        else:
-            return f"{self.result}"
+        return format_mark(self.result, self.event.unit)
 
     @property
     def fat_adjusted_result(self):
-        if self.event.unit == "inches":
-            return self.result
-
-        if self.method == 'Hand':
-            if self.result > 180.0:
-                return self.result + 0.14
-            else:
-                return self.result + 0.24
-
-        return self.result
+        return fat_adjusted(self.result, self.method, self.event.unit)
 
     @property
     def milestone_num(self):
-        """Use dictionary to lookup which milestone we are at if any"""
-        milestones = EVENT_MILESTONES.get(self.event.name)
-        if not milestones:
-            return None
-
-        for x, milestone in enumerate(milestones):
-            if self.event.unit == "inches":
-                if self.result >= milestone:
-                    return x
-            elif self.event.unit == 'seconds':
-                if self.result < milestone:
-                    return x
-        return None
+        """Lookup which milestone we are at if any"""
+        table = get_milestone_table(self.event.name, self.event.unit)
+        milestone = table.lookup(self.result) if table else None
+        return milestone[0] if milestone else None
 
     def get_milestone_value(self, milestone_num):
-        return EVENT_MILESTONES[self.event.name][milestone_num]
+        return get_milestone_table(self.event.name, self.event.unit).milestones[milestone_num]
 
-    def add_milestone(self, milestone_msg):
-        if self.milestones:
-            self.milestones += f" {milestone_msg}"
-        else:
-            self.milestones = milestone_msg
+    @property
+    def milestones(self):
+        """The result's milestone awards as text, prefetch milestone_awards
+        (see MILESTONE_AWARDS_PREFETCH) when showing a list of results."""
+        messages = [award.message for award in self.milestone_awards.all()]
+        return " ".join(messages) or None
         
 admin.site.register(Result)
 
 
-def calculate_result_stats(user):
-    user.results.update(milestones=None)
-    Result.qualifications.through.objects.filter(result__athlete=user).delete()
+class MilestoneAward(models.Model):
+    """A milestone a result earned, e.g. a first time or a personal best.
+
+    Kept up to date by the stats engine, and only turned into text for
+    display. The athlete, event and meet date are copied from the result so
+    awards can be found without a join.
+    """
+    FIRST = 1
+    PERSONAL_BEST = 2
+    QUALIFIED = 3
+    BROKE = 4
+    KIND_CHOICES = [
+        (FIRST, 'First time'),
+        (PERSONAL_BEST, 'Personal best'),
+        (QUALIFIED, 'Qualified'),
+        (BROKE, 'Broke milestone'),
+    ]
 
-    results_by_date = {}
-    for result in user.results.all().prefetch_related(
-        'event'
-    ).order_by(
-        'meet__date'
-    ):
-        results_by_date.setdefault(result.event, []).append(result)
+    kind = models.IntegerField(choices=KIND_CHOICES)
+    result = models.ForeignKey(Result, on_delete=models.CASCADE, related_name='milestone_awards')
+    athlete = models.ForeignKey(User, on_delete=models.CASCADE, related_name='milestone_awards')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='milestone_awards')
+    date = DateField()
+    qualifying_level = models.ForeignKey(
+        'QualifyingLevel', null=True, blank=True, on_delete=models.CASCADE,
+        related_name='milestone_awards')
+    # The milestone mark that was broken
+    value = FloatField(null=True, blank=True)
 
-    for event, results in results_by_date.items():
-        first = results[0]
-        first.milestones = f"First time in the {event.name}."
-        first.save()
-    
+    class Meta:
+        ordering = ['kind', 'qualifying_level_id', 'id']
+        indexes = [
+            models.Index(fields=['kind', 'date']),
+            models.Index(fields=['athlete', 'event']),
+        ]
+
+    def __str__(self):
+        return f"{self.result_id}: {self.message}"
 
-    results_by_event = {}
-    for result in user.results.all().prefetch_related(
-        'event',
-        'meet',
-        'meet__season'
-    ).order_by(
-        'result',
-    ):
-        results_by_event.setdefault(result.event, []).append(result)
-
-    qualifying_qs = QualifyingLevel.objects.filter(gender=user.gender)
-    qualifying_level_dict = {}
-    for ql in qualifying_qs:
-        key = f"{ql.event_id}--{ql.season_id}"
-        qualifying_level_dict.setdefault(key, []).append(ql)
-
-
-    for event, results in results_by_event.items():
-        if event.unit == 'inches':
-            reverse = True
+    @property
+    def message(self):
+        event = self.result.event
+        if self.kind == self.FIRST:
+            return f"First time in the {event.name}."
+        elif self.kind == self.PERSONAL_BEST:
+            return 'New Personal Best!'
+        elif self.kind == self.QUALIFIED:
+            ql = self.qualifying_level
+            return f"Qualified for {ql.description} ({ql.formatted_value})."
         else:
-            reverse = False
-
-        # Order by performance and figure out ranking
-        for rank, result in enumerate(
-            sorted(results, key=lambda x: x.fat_adjusted_result, reverse=reverse)):
-
-            if rank == 0:
-                result.add_milestone('New Personal Best!')
-
-            result.personal_rank = rank+1
-            result.save()
-
-            # Also see if it qualifies for anything
-            key = f"{result.event_id}--{result.meet.season_id}"
-            qualifying_levels = qualifying_level_dict.get(key, [])
-            for ql in qualifying_levels:
-                if event.unit == 'inches':
-                    if result.result >= ql.value:
-                        result.qualifications.add(ql)
-                        msg = f"Qualified for {ql.description} ({ql.formatted_value})."
-                        result.add_milestone(msg)
-                else:
-                    if result.fat_adjusted_result <= ql.value:
-                        result.qualifications.add(ql)
-                        msg = f"Qualified for {ql.description} ({ql.formatted_value})."
-                        result.add_milestone(msg)
-
-        # Figure out any milestones by sorting by date,
-        # then go keep track of what milestone we are at
-        # and see if it changes
-        last_milestone_num = None
-        for result in sorted(results, key=lambda x: x.meet.date):
-            milestone_num = result.milestone_num
-            if milestone_num is None:
-                continue
-            if (last_milestone_num is None) or (milestone_num < last_milestone_num):
-                last_milestone_num = milestone_num
-                milestone_result = Result(result=result.get_milestone_value(milestone_num), event=event)
-                milestone_msg = f"Broke {milestone_result.formatted_result}."
-                result.add_milestone(milestone_msg)
-                result.save()
+            return f"Broke {format_mark(self.value, event.unit)}."
 
 
-    
+MILESTONE_AWARDS_PREFETCH = models.Prefetch(
+    'milestone_awards',
+    queryset=MilestoneAward.objects.select_related('qualifying_level__event'),
+)
+
+
+class MeetSummary(models.Model):
+    """The counts shown on a meet's page for one of its events, or for the
+    whole meet when event is null.
+
+    Kept up to date by summaries.update_meet_summaries whenever a meet's
+    results or their stats change.
+    """
+    meet = models.ForeignKey(Meet, on_delete=models.CASCADE, related_name='summaries')
+    event = models.ForeignKey(Event, null=True, blank=True, on_delete=models.CASCADE, related_name='meet_summaries')
+    results = models.IntegerField(default=0)
+    athletes = models.IntegerField(default=0)
+    personal_records = models.IntegerField(default=0)
+    qualifications = models.IntegerField(default=0)
+    milestones = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['meet', 'event'],
+                name='unique_meet_event_summary'),
+            models.UniqueConstraint(
+                fields=['meet'],
+                condition=models.Q(event=None),
+                name='unique_meet_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.meet_id} {self.event_id or 'all events'}: {self.results} results"
+
+
+class PersonalBest(models.Model):
+    """An athlete's best result in an event, all time or for one season.
+
+    Kept up to date by the stats engine, season is null for the all time best.
+    """
+    athlete = models.ForeignKey(User, on_delete=models.CASCADE, related_name='personal_bests')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='personal_bests')
+    season = models.ForeignKey('Season', null=True, on_delete=models.CASCADE, related_name='personal_bests')
+    result = models.ForeignKey(Result, on_delete=models.CASCADE, related_name='personal_bests')
+    value = FloatField()
+    adjusted_value = FloatField()
+    date = DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['athlete', 'event', 'season'],
+                name='unique_season_personal_best'),
+            models.UniqueConstraint(
+                fields=['athlete', 'event'],
+                condition=models.Q(season=None),
+                name='unique_personal_best'),
+        ]
+        indexes = [
+            models.Index(fields=['event', 'season', 'adjusted_value']),
+            models.Index(fields=['season', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.athlete_id} {self.event_id} ({self.season_id}): {self.value}"
+
+
+class RecentAchievement(models.Model):
+    """A result becoming a personal best or breaking a milestone, for the
+    feed on the home page.
+
+    Appended by the stats engine the first time a result earns the award
+    and never rewritten, so the feed is one indexed read. Dated by the meet.
+    """
+    FEED_KINDS = [MilestoneAward.PERSONAL_BEST, MilestoneAward.BROKE]
+
+    kind = models.IntegerField(choices=MilestoneAward.KIND_CHOICES)
+    result = models.ForeignKey(Result, on_delete=models.CASCADE, related_name='recent_achievements')
+    athlete = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recent_achievements')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='recent_achievements')
+    date = DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['result', 'kind'],
+                name='unique_recent_achievement'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.result_id}: {self.get_kind_display()} on {self.date}"
+
+    @property
+    def formatted_result(self):
+        return format_mark(self.result.result, self.event.unit)
+
+
+class StatsJob(models.Model):
+    """Stats waiting to be recalculated by the run_stats_worker command.
+
+    A null event means every event for the athlete. There is at most one
+    unclaimed job per athlete and event, so repeated edits are merged.
+    """
+    athlete = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stats_jobs')
+    event = models.ForeignKey(Event, null=True, blank=True, on_delete=models.CASCADE, related_name='stats_jobs')
+    created = models.DateTimeField(auto_now_add=True)
+    claimed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['athlete', 'event'],
+                condition=models.Q(claimed=None),
+                name='unique_pending_stats_job'),
+            models.UniqueConstraint(
+                fields=['athlete'],
+                condition=models.Q(claimed=None, event=None),
+                name='unique_pending_athlete_stats_job'),
+        ]
+        indexes = [
+            models.Index(fields=['claimed', 'created']),
+        ]
+
+    def __str__(self):
+        return f"{self.athlete_id} {self.event_id or 'all events'}"
+
+
+class ImportRun(models.Model):
+    """Progress of a spreadsheet imported a chunk of rows at a time.
+
+    rows_done counts the rows committed so far, an import that stopped
+    part way carries on from there (see importers.continue_import). name
+    is the path given to import_spreadsheet, or only the file name for an
+    upload, so a stopped upload is resumed by passing its file again.
+    """
+    name = CharField(max_length=255)
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='import_runs')
+    season = models.ForeignKey('Season', on_delete=models.CASCADE, related_name='import_runs')
+    gender = CharField(max_length=255, choices=GENDER_CHOICES)
+    chunk_size = models.IntegerField()
+    rows_done = models.IntegerField(default=0)
+    results = models.IntegerField(default=0)
+    error = TextField(blank=True)
+    started = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def status(self):
+        if self.finished:
+            return 'finished'
+        return 'failed' if self.error else 'running'
+
+    def __str__(self):
+        return f"{self.id}: {self.name} ({self.status}, {self.rows_done} rows)"
+admin.site.register(ImportRun)
+
 
 class Goal(models.Model):
     user = models.ForeignKey(User, related_name="goals", on_delete=models.CASCADE)
@@ -255,14 +417,7 @@ class QualifyingLevel(models.Model):
 
     @property
     def formatted_value(self):
-        if self.event.unit == "inches":
-            feet, inches = divmod(self.value, 12)
-            return f"{int(feet):02}'{inches:05.2f}"
-        elif self.event.unit == 'seconds':
-            minutes, seconds = divmod(self.value, 60)
-            return f"{int(minutes):02}:{seconds:05.2f}"
-        else:
-            return f"{self.value}"
+        return format_mark(self.value, self.event.unit)
 
 
 class Season(models.Model):
@@ -0,0 +1,100 @@
+import json
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+
+from .achievements import bump_feed_version
+from .models import MILESTONE_AWARDS_PREFETCH, Meet, QualifyingLevel, Result
+
+ATHLETE_VERSION_KEY = 'trackapp:athlete-version:{}'
+
+
+def athlete_version(athlete_id):
+    """A token for cache keys that changes when the athlete's stats do."""
+    return cache.get_or_set(
+        ATHLETE_VERSION_KEY.format(athlete_id), lambda: uuid.uuid4().hex, None)
+
+
+def bump_athlete_versions(athlete_ids):
+    """Give athletes new versions, so anything cached for them is stale."""
+    cache.set_many({
+        ATHLETE_VERSION_KEY.format(athlete_id): uuid.uuid4().hex
+        for athlete_id in athlete_ids
+    }, None)
+
+
+@receiver(post_save, sender=Meet)
+def meet_changed(sender, instance, created, **kwargs):
+    # Profiles show the meet's name and are ordered by its date, and the
+    # home page lists recent meets
+    if created:
+        return
+    athlete_ids = set(Result.objects.filter(
+        meet=instance).values_list('athlete_id', flat=True))
+    transaction.on_commit(lambda: bump_athlete_versions(athlete_ids))
+    transaction.on_commit(bump_feed_version)
+
+
+@receiver(post_save, sender=QualifyingLevel)
+@receiver(pre_delete, sender=QualifyingLevel)
+def qualifying_level_changed(sender, instance, **kwargs):
+    # Profiles show the descriptions of the levels results met. On delete
+    # the athletes are read before the level's qualifications go.
+    athlete_ids = set(Result.qualifications.through.objects.filter(
+        qualifyinglevel=instance).values_list('result__athlete_id', flat=True))
+    transaction.on_commit(lambda: bump_athlete_versions(athlete_ids))
+
+
+# One event's section of a profile, results are oldest first and chart is
+# the JSON data for its Chart.js line chart
+ProfileEvent = namedtuple('ProfileEvent', ['event', 'results', 'chart'])
+
+
+class AthleteProfile:
+    """The results on an athlete's profile, grouped by event.
+
+    Nothing is read until events is used, so a page served from the
+    cached fragment doesn't query results at all. When it is, results
+    come with their event, meet and season in one query, their
+    qualifications and milestone awards in one more each, and are grouped
+    in the same pass.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def version(self):
+        return athlete_version(self.user.id)
+
+    @cached_property
+    def events(self):
+        results = Result.objects.filter(
+            athlete=self.user
+        ).select_related(
+            'event', 'meet__season'
+        ).prefetch_related(
+            Prefetch('qualifications', queryset=QualifyingLevel.objects.order_by('id')),
+            MILESTONE_AWARDS_PREFETCH,
+        ).order_by(
+            'meet__date', 'id'
+        )
+
+        results_by_event = {}
+        for result in results:
+            results_by_event.setdefault(result.event_id, (result.event, []))[1].append(result)
+
+        return [
+            ProfileEvent(event, event_results, json.dumps({
+                'labels': [result.meet.description for result in event_results],
+                'data': [result.result for result in event_results],
+            }))
+            for event, event_results in sorted(
+                results_by_event.values(), key=lambda item: item[0].name)
+        ]
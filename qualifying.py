@@ -0,0 +1,118 @@
+import bisect
+import uuid
+from operator import attrgetter
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Event, QualifyingLevel
+
+INDEX_VERSION_KEY = 'trackapp:qualifying-index-version'
+
+
+class QualifyingIndex:
+    """Qualifying levels sorted by value for each (event, season, gender).
+
+    Answers "which levels does this mark meet" with a bisect rather than
+    checking every level. Levels keep their event and season loaded so
+    formatted_value and templates don't need another query.
+    """
+
+    def __init__(self, levels):
+        self.levels = list(levels)
+
+        by_key = {}
+        for ql in self.levels:
+            by_key.setdefault((ql.event_id, ql.season_id, ql.gender), []).append(ql)
+
+        self._by_key = by_key
+        self._sorted = {}
+        for key, levels in by_key.items():
+            levels = sorted(levels, key=attrgetter('value', 'id'))
+            self._sorted[key] = ([ql.value for ql in levels], levels)
+
+    @classmethod
+    def build(cls):
+        return cls(QualifyingLevel.objects.select_related(
+            'event', 'season'
+        ).order_by(
+            'id'
+        ))
+
+    def levels_for(self, event_id, season_id, gender):
+        """Every level for an event, season and gender in id order."""
+        return self._by_key.get((event_id, season_id, gender), [])
+
+    def levels_met(self, event_id, season_id, gender, mark, unit):
+        """Levels a mark meets in id order.
+
+        Times should already be FAT adjusted. Jumps and throws meet a level
+        at or over its value and times meet it at or under.
+        """
+        values, levels = self._sorted.get((event_id, season_id, gender), ([], []))
+        if unit == 'inches':
+            met = levels[:bisect.bisect_right(values, mark)]
+        else:
+            met = levels[bisect.bisect_left(values, mark):]
+        return sorted(met, key=attrgetter('id'))
+
+    def filter(self, event=None, season=None, gender=None):
+        """Levels matching the given filters in id order."""
+        return [
+            ql for ql in self.levels
+            if (event is None or ql.event_id == event.id)
+            and (season is None or ql.season_id == season.id)
+            and (not gender or ql.gender == gender)
+        ]
+
+
+_index = None
+_index_version = None
+
+
+def get_qualifying_index():
+    """The process wide QualifyingIndex, rebuilt after levels change.
+
+    The version lives in the cache so that with a shared cache backend a
+    change made in one process also invalidates every other process.
+    """
+    global _index, _index_version
+
+    version = cache.get_or_set(INDEX_VERSION_KEY, lambda: uuid.uuid4().hex, None)
+    if _index is None or _index_version != version:
+        index = QualifyingIndex.build()
+        if connection.in_atomic_block:
+            # It may hold levels that are rolled back, so it isn't kept
+            return index
+        _index = index
+        _index_version = version
+    return _index
+
+
+def invalidate_qualifying_index():
+    """Rebuild the index in this process on next use, and in every other
+    process once the change is committed.
+
+    The new version is only published on commit, otherwise another process
+    could rebuild from the old levels and keep that under the new version.
+    """
+    global _index
+
+    _index = None
+    transaction.on_commit(publish_qualifying_index_version)
+
+
+def publish_qualifying_index_version():
+    global _index
+
+    _index = None
+    cache.set(INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+@receiver(post_save, sender=QualifyingLevel)
+@receiver(post_delete, sender=QualifyingLevel)
+@receiver(post_save, sender=Event)
+def qualifying_level_changed(sender, **kwargs):
+    invalidate_qualifying_index()
@@ -82,6 +82,17 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Seconds a write waits for another one to commit before failing
+        'OPTIONS': {'timeout': 20},
+    }
+}
+
+# Shared by the web and run_stats_worker processes, so a version bumped
+# by the worker invalidates what the site has cached
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
     }
 }
 
@@ -135,6 +146,25 @@ CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 LOGIN_URL = "/login"
 
+# Worker processes used by management commands and run_stats_worker when
+# recalculating stats for many athletes, requests only use their own process
+STATS_WORKERS = 4
+
+# Queue stats changes for the run_stats_worker command instead of
+# recalculating them during the request
+STATS_QUEUE = True
+
+# Rows committed at a time by spreadsheet uploads and import_spreadsheet
+IMPORT_CHUNK_SIZE = 1000
+
+# How long the results part of a profile stays cached, it is replaced
+# sooner whenever the athlete's stats are recalculated
+PROFILE_CACHE_SECONDS = 24 * 60 * 60
+
+# How long the home page stays cached, it is replaced sooner whenever
+# stats are written
+HOME_CACHE_SECONDS = 60 * 60
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
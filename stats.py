@@ -0,0 +1,446 @@
+import multiprocessing
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .achievements import append_achievements, bump_feed_version
+from .milestones import get_milestone_table
+from .models import (
+    MilestoneAward, PersonalBest, Result, User, fat_adjusted)
+from .profiles import bump_athlete_versions
+from .qualifying import get_qualifying_index
+from .summaries import update_meet_summaries
+
+
+# The only columns the engine needs, read in a single query per athlete.
+STAT_COLUMNS = (
+    'id',
+    'athlete_id',
+    'event_id',
+    'event__name',
+    'event__unit',
+    'result',
+    'method',
+    'meet__date',
+    'meet__season_id',
+    'personal_rank',
+    'meet_id',
+)
+
+StatRow = namedtuple('StatRow', [
+    'id',
+    'athlete_id',
+    'event_id',
+    'event_name',
+    'unit',
+    'result',
+    'method',
+    'date',
+    'season_id',
+    'personal_rank',
+    'meet_id',
+])
+
+RESULT_RANK_UPDATE = (
+    f"UPDATE {Result._meta.db_table} SET personal_rank = %s WHERE id = %s"
+)
+
+# Computed stats for a single result. Awards are (kind, qualifying level id,
+# milestone value) tuples in the order they are shown.
+ResultStats = namedtuple('ResultStats', [
+    'personal_rank',
+    'awards',
+    'qualifications',
+])
+
+
+class StatsReport(namedtuple('StatsReport', ['athletes', 'results', 'seconds'])):
+
+    @property
+    def athletes_per_second(self):
+        return self.athletes / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (
+            f"Recalculated {self.results} results for {self.athletes} athletes "
+            f"in {self.seconds:.2f}s ({self.athletes_per_second:.1f} athletes/s)")
+
+
+def stats_groups(results):
+    """The (athlete id, event id) groups a set of results belongs to."""
+    return {(result.athlete_id, result.event_id) for result in results}
+
+
+def update_result_stats(groups, workers=1):
+    """Recalculate stats for only the given (athlete id, event id) groups.
+
+    Every stat is worked out per athlete and event, so this gives the same
+    output as a full calculate_result_stats for the groups it touches.
+    """
+    events_by_athlete = {}
+    for athlete_id, event_id in groups:
+        events_by_athlete.setdefault(athlete_id, set()).add(event_id)
+
+    return recompute_stats(events_by_athlete, workers)
+
+
+def recompute_stats(events_by_athlete, workers=1, chunk_size=25):
+    """Recalculate stats for many athletes, on a pool of worker processes
+    when workers is more than 1.
+
+    ``events_by_athlete`` maps athlete id to the event ids to rebuild, or
+    None to rebuild all of them. Workers only compute; every read and write
+    happens in this process, so SQLite only ever has a single writer.
+    Forking a pool is for management commands and the stats worker, a
+    request never asks for more than this process. Returns a StatsReport.
+    """
+    start = time.perf_counter()
+    athlete_ids = sorted(events_by_athlete)
+    genders = dict(User.objects.filter(
+        id__in=athlete_ids).values_list('id', 'gender'))
+    index = get_qualifying_index()
+    chunks = [
+        athlete_ids[x:x + chunk_size]
+        for x in range(0, len(athlete_ids), chunk_size)
+    ]
+
+    def load(chunk):
+        query = Q()
+        for athlete_id in chunk:
+            events = events_by_athlete[athlete_id]
+            if events is None:
+                query |= Q(athlete_id=athlete_id)
+            else:
+                query |= Q(athlete_id=athlete_id, event__in=events)
+        results = Result.objects.filter(query)
+        return results, load_stat_rows(results)
+
+    meet_ids = set()
+
+    def write(results, rows, stats):
+        with transaction.atomic():
+            write_stats(rows, stats, results)
+        meet_ids.update(row.meet_id for row in rows)
+        return len(rows)
+
+    total = 0
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            results, rows = load(chunk)
+            total += write(results, rows, compute_athlete_stats(rows, genders, index))
+    else:
+        # Workers are forked so they share the loaded app, and never touch
+        # the database. Only a couple of chunks per worker are read ahead.
+        pool = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=init_stats_worker,
+            initargs=(genders, index),
+        )
+        with pool:
+            chunks = iter(chunks)
+            pending = {}
+            while True:
+                while len(pending) < workers * 2:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    results, rows = load(chunk)
+                    pending[pool.submit(compute_worker_stats, rows)] = (results, rows)
+                if not pending:
+                    break
+                done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results, rows = pending.pop(future)
+                    total += write(results, rows, future.result())
+
+    stats_written(athlete_ids, meet_ids)
+    return StatsReport(len(athlete_ids), total, time.perf_counter() - start)
+
+
+def compute_athlete_stats(rows, genders, index):
+    """compute_stats for rows that may span several athletes."""
+    rows_by_athlete = {}
+    for row in rows:
+        rows_by_athlete.setdefault(row.athlete_id, []).append(row)
+
+    stats = {}
+    for athlete_id, athlete_rows in rows_by_athlete.items():
+        stats.update(compute_stats(athlete_rows, genders[athlete_id], index))
+    return stats
+
+
+_worker_state = {}
+
+
+def init_stats_worker(genders, index):
+    _worker_state['genders'] = genders
+    _worker_state['index'] = index
+
+
+def compute_worker_stats(rows):
+    return compute_athlete_stats(
+        rows, _worker_state['genders'], _worker_state['index'])
+
+
+def calculate_result_stats(user, events=None):
+    """Rebuild ranks, milestones, qualifications and personal bests.
+
+    Pass ``events`` (events or event ids) to only rebuild those events.
+    """
+    results = Result.objects.filter(athlete=user)
+    if events is not None:
+        results = results.filter(event__in=events)
+
+    rows = load_stat_rows(results)
+    stats = compute_stats(rows, user.gender, get_qualifying_index())
+
+    with transaction.atomic():
+        write_stats(rows, stats, results)
+    stats_written([user.id], {row.meet_id for row in rows})
+
+
+def stats_written(athlete_ids, meet_ids):
+    """Bring what is worked out from stats up to date after writing them.
+
+    Meet summaries are recounted straight away. Cached profiles and the
+    cached home page are invalidated once the transaction commits, so a
+    page can't cache results from before the change.
+    """
+    update_meet_summaries(meet_ids)
+    transaction.on_commit(lambda: bump_athlete_versions(athlete_ids))
+    transaction.on_commit(bump_feed_version)
+
+
+def load_stat_rows(results):
+    return [StatRow(*values) for values in results.order_by(
+        'meet__date', 'id'
+    ).values_list(*STAT_COLUMNS)]
+
+
+def compute_stats(rows, gender, index):
+    """Work out every result's stats for one athlete in memory.
+
+    ``rows`` must be ordered by meet date then id, as load_stat_rows
+    returns them, and ``index`` is a QualifyingIndex. Returns a dict of
+    result id to ResultStats.
+    """
+    rows_by_event = {}
+    for row in rows:
+        rows_by_event.setdefault(row.event_id, []).append(row)
+
+    stats = {}
+    for event_rows in rows_by_event.values():
+        stats.update(compute_event_stats(event_rows, gender, index))
+    return stats
+
+
+def compute_event_stats(rows, gender, index):
+    """Stats for one athlete's results in one event, ordered by date."""
+    unit = rows[0].unit
+    awards = {row.id: [] for row in rows}
+    qualifications = {row.id: [] for row in rows}
+    ranks = {}
+
+    awards[rows[0].id].append((MilestoneAward.FIRST, None, None))
+
+    # Order by performance and figure out ranking, ties go to the
+    # smaller raw mark and then the earlier entry
+    if unit == 'inches':
+        rank_key = lambda row: (-row.result, row.id)
+    else:
+        rank_key = lambda row: (
+            fat_adjusted(row.result, row.method, unit), row.result, row.id)
+
+    for rank, row in enumerate(sorted(rows, key=rank_key)):
+        if rank == 0:
+            awards[row.id].append((MilestoneAward.PERSONAL_BEST, None, None))
+        ranks[row.id] = rank + 1
+
+        # Also see if it qualifies for anything
+        adjusted = fat_adjusted(row.result, row.method, unit)
+        for ql in index.levels_met(
+                row.event_id, row.season_id, gender, adjusted, unit):
+            qualifications[row.id].append(ql.id)
+            awards[row.id].append((MilestoneAward.QUALIFIED, ql.id, None))
+
+    # Figure out any milestones by going through by date and keeping
+    # track of what milestone we are at to see if it changes
+    table = get_milestone_table(rows[0].event_name, unit)
+    if table:
+        by_date = sorted(rows, key=lambda row: (row.date, row.result, row.id))
+        milestones = table.lookup_many([row.result for row in by_date])
+        last_milestone_num = None
+        for row, milestone in zip(by_date, milestones):
+            if milestone is None:
+                continue
+            milestone_num, value = milestone
+            if (last_milestone_num is None) or (milestone_num < last_milestone_num):
+                last_milestone_num = milestone_num
+                awards[row.id].append((MilestoneAward.BROKE, None, value))
+
+    return {
+        row.id: ResultStats(ranks[row.id], awards[row.id], qualifications[row.id])
+        for row in rows
+    }
+
+
+def write_stats(rows, stats, results):
+    """Write computed stats back for the results the rows were read from.
+
+    Only results whose rank changed are updated, the qualifications,
+    milestone awards and personal bests are replaced with a single insert
+    each. New personal bests and milestones are appended to the feed.
+    """
+    changed = [
+        (stats[row.id].personal_rank, row.id)
+        for row in rows
+        if row.personal_rank != stats[row.id].personal_rank
+    ]
+
+    # QuerySet.bulk_update builds a CASE expression per row in Python, which
+    # costs far more than the update itself. One prepared statement run
+    # for every changed row is the same batch without that overhead.
+    with connection.cursor() as cursor:
+        cursor.executemany(RESULT_RANK_UPDATE, changed)
+
+    through = Result.qualifications.through
+    through.objects.filter(result__in=results).delete()
+    through.objects.bulk_create([
+        through(result_id=result_id, qualifyinglevel_id=ql_id)
+        for result_id, result_stats in stats.items()
+        for ql_id in result_stats.qualifications
+    ], batch_size=500)
+
+    MilestoneAward.objects.filter(result__in=results).delete()
+    MilestoneAward.objects.bulk_create([
+        MilestoneAward(
+            kind=kind,
+            result_id=row.id,
+            athlete_id=row.athlete_id,
+            event_id=row.event_id,
+            date=row.date,
+            qualifying_level_id=ql_id,
+            value=value,
+        )
+        for row in rows
+        for kind, ql_id, value in stats[row.id].awards
+    ], batch_size=500)
+    append_achievements(rows, stats)
+
+    PersonalBest.objects.filter(result__in=results).delete()
+    PersonalBest.objects.bulk_create(
+        personal_bests(rows, stats), batch_size=500)
+
+
+def personal_bests(rows, stats):
+    """PersonalBest rows for the best result overall and in each season.
+
+    The best result is the one ranked highest, so ties break the same way
+    as personal_rank.
+    """
+    best = {}
+    for row in rows:
+        rank = stats[row.id].personal_rank
+        for season_id in (None, row.season_id):
+            key = (row.athlete_id, row.event_id, season_id)
+            if key not in best or rank < stats[best[key].id].personal_rank:
+                best[key] = row
+
+    return [
+        PersonalBest(
+            athlete_id=row.athlete_id,
+            event_id=row.event_id,
+            season_id=season_id,
+            result_id=row.id,
+            value=row.result,
+            adjusted_value=fat_adjusted(row.result, row.method, row.unit),
+            date=row.date,
+        )
+        for (athlete_id, event_id, season_id), row in best.items()
+    ]
+
+
+# The most fat_adjusted adds to a hand time
+MAX_HAND_ADJUSTMENT = 0.24
+
+
+def requalify(changes):
+    """Bring qualifications up to date after qualifying levels change.
+
+    ``changes`` are (level, old value) pairs, with None as the old value
+    for a new level or one moved to another event, season or gender. Only
+    results with a mark between a level's old and new value can have
+    started or stopped meeting it, so just those are read, with a range
+    query on the mark within the level's event, season and gender.
+    Call invalidate_qualifying_index first. Returns the number of results
+    checked.
+    """
+    through = Result.qualifications.through
+    checked = 0
+    athlete_ids = set()
+    meet_ids = set()
+    for level, old_value in changes:
+        unit = level.event.unit
+        results = Result.objects.filter(
+            event_id=level.event_id,
+            meet__season_id=level.season_id,
+            athlete__gender=level.gender,
+        )
+        if old_value is None:
+            # Nothing can be assumed about results the level was met by
+            for athlete_id, meet_id in through.objects.filter(
+                    qualifyinglevel=level).values_list('result__athlete_id', 'result__meet_id'):
+                athlete_ids.add(athlete_id)
+                meet_ids.add(meet_id)
+            through.objects.filter(qualifyinglevel=level).delete()
+            MilestoneAward.objects.filter(
+                kind=MilestoneAward.QUALIFIED, qualifying_level=level).delete()
+            if unit == 'inches':
+                results = results.filter(result__gte=level.value)
+            else:
+                results = results.filter(result__lte=level.value)
+        else:
+            low, high = sorted([old_value, level.value])
+            if unit != 'inches':
+                low -= MAX_HAND_ADJUSTMENT
+            results = results.filter(result__gte=low, result__lte=high)
+            through.objects.filter(
+                qualifyinglevel=level, result__in=results).delete()
+            MilestoneAward.objects.filter(
+                kind=MilestoneAward.QUALIFIED, qualifying_level=level,
+                result__in=results).delete()
+
+        rows = list(results.values_list(
+            'id', 'athlete_id', 'result', 'method', 'meet__date', 'meet_id'))
+        checked += len(rows)
+        athlete_ids.update(row[1] for row in rows)
+        meet_ids.update(row[5] for row in rows)
+
+        met = []
+        for row in rows:
+            adjusted = fat_adjusted(row[2], row[3], unit)
+            if adjusted >= level.value if unit == 'inches' else adjusted <= level.value:
+                met.append(row)
+
+        through.objects.bulk_create([
+            through(result_id=result_id, qualifyinglevel_id=level.id)
+            for result_id, athlete_id, mark, method, date, meet_id in met
+        ], batch_size=500)
+        MilestoneAward.objects.bulk_create([
+            MilestoneAward(
+                kind=MilestoneAward.QUALIFIED,
+                result_id=result_id,
+                athlete_id=athlete_id,
+                event_id=level.event_id,
+                date=date,
+                qualifying_level_id=level.id,
+            )
+            for result_id, athlete_id, mark, method, date, meet_id in met
+        ], batch_size=500)
+
+    stats_written(athlete_ids, meet_ids)
+    return checked
@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models import Count
+
+from .models import MeetSummary, MilestoneAward, Result
+
+# MeetSummary field for each kind of award that is counted
+AWARD_COUNT_FIELDS = {
+    MilestoneAward.PERSONAL_BEST: 'personal_records',
+    MilestoneAward.QUALIFIED: 'qualifications',
+    MilestoneAward.BROKE: 'milestones',
+}
+
+
+def update_meet_summaries(meet_ids):
+    """Recount the MeetSummary rows of the given meets.
+
+    Results and awards are counted with one grouped query each for every
+    event, and one more each for the meets as a whole, however many meets
+    there are.
+    """
+    meet_ids = set(meet_ids)
+    if not meet_ids:
+        return
+
+    results = Result.objects.filter(meet__in=meet_ids).order_by()
+    awards = MilestoneAward.objects.filter(
+        result__meet__in=meet_ids, kind__in=AWARD_COUNT_FIELDS).order_by()
+
+    summaries = {}
+    for group in [('meet_id', 'event_id'), ('meet_id',)]:
+        for values in results.values(*group).annotate(
+                count=Count('id'), athlete_count=Count('athlete_id', distinct=True)):
+            key = (values['meet_id'], values.get('event_id'))
+            summaries[key] = MeetSummary(
+                meet_id=key[0],
+                event_id=key[1],
+                results=values['count'],
+                athletes=values['athlete_count'],
+            )
+
+        # By the result's event, awards still hold the old one until the
+        # stats of an edited result are recalculated
+        award_group = ['result__meet_id', 'result__event_id'][:len(group)]
+        for values in awards.values(*award_group, 'kind').annotate(count=Count('id')):
+            key = (values['result__meet_id'], values.get('result__event_id'))
+            setattr(summaries[key], AWARD_COUNT_FIELDS[values['kind']], values['count'])
+
+    with transaction.atomic():
+        MeetSummary.objects.filter(meet__in=meet_ids).delete()
+        MeetSummary.objects.bulk_create(summaries.values(), batch_size=500)
+
+
+def meet_summary(meet):
+    """The whole meet's MeetSummary, all zeros for a meet without results."""
+    summary = meet.summaries.filter(event=None).first()
+    return summary or MeetSummary(meet=meet)
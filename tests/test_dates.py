@@ -0,0 +1,58 @@
+"""Meet dates read from spreadsheet cells, with the year from the season."""
+import datetime
+
+from django.test import SimpleTestCase
+
+from ..dates import DateResolver, season_years
+from ..models import Season
+
+
+class DateResolverTests(SimpleTestCase):
+
+    def resolve(self, season_name, value):
+        return DateResolver(Season(name=season_name)).resolve(value)
+
+    def test_season_years(self):
+        for name, years in [
+                ('Outdoor 2022', (2022, 2022)),
+                ('Indoor 2021-22', (2021, 2022)),
+                ('Indoor 2021/2022', (2021, 2022)),
+                ('1999-00', (1999, 2000)),
+                ('Varsity', None)]:
+            self.assertEqual(season_years(Season(name=name)), years, name)
+
+    def test_dates_with_a_year(self):
+        for value in [
+                '4/2/2022', '04/02/22', '2022-04-02', 'Apr 2, 2022', 'April 2 2022',
+                '2 Apr 2022', datetime.datetime(2022, 4, 2, 9, 30),
+                datetime.date(2022, 4, 2)]:
+            # The season's year doesn't matter
+            self.assertEqual(
+                self.resolve('Indoor 2019-20', value), datetime.date(2022, 4, 2), value)
+
+    def test_month_and_day(self):
+        for season, value, date in [
+                ('Outdoor 2022', '4/2', datetime.date(2022, 4, 2)),
+                ('Indoor 2021-22', '12/4', datetime.date(2021, 12, 4)),
+                ('Indoor 2021-22', '1/14', datetime.date(2022, 1, 14)),
+                ('Indoor 2023-24', '2/29', datetime.date(2024, 2, 29)),
+                ('Indoor 2022-23', '2/29', None)]:
+            self.assertEqual(self.resolve(season, value), date, (season, value))
+
+    def test_month_name_and_day(self):
+        for season, value, date in [
+                ('Outdoor 2022', 'Apr 2', datetime.date(2022, 4, 2)),
+                ('Indoor 2021-22', 'Jan 14', datetime.date(2022, 1, 14)),
+                ('Indoor 2021-22', 'January 14', datetime.date(2022, 1, 14)),
+                ('Indoor 2021-22', '14 Jan', datetime.date(2022, 1, 14)),
+                ('Indoor 2021-22', '4 December', datetime.date(2021, 12, 4)),
+                ('Indoor 2023-24', 'Feb 29', datetime.date(2024, 2, 29)),
+                ('Indoor 2022-23', 'Feb 29', None)]:
+            self.assertEqual(self.resolve(season, value), date, (season, value))
+
+    def test_mixed_formats_in_a_column(self):
+        dates = DateResolver(Season(name='Indoor 2021-22'))
+        self.assertEqual(
+            [dates.resolve(value) for value in ['12/4/2021', 'Jan 14', '2022-01-21', '1/28', '12/4/2021']],
+            [datetime.date(2021, 12, 4), datetime.date(2022, 1, 14), datetime.date(2022, 1, 21),
+             datetime.date(2022, 1, 28), datetime.date(2021, 12, 4)])
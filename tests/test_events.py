@@ -0,0 +1,60 @@
+"""Event names from spreadsheets matched against the known names."""
+from django.test import SimpleTestCase
+
+from ..event_dict import EVENT_DICT
+from ..events import get_unit_for_event, normalize_event_name, suggest_event_name
+
+
+def words_unit(event_name):
+    """The unit the importer has always given an event by name."""
+    name = event_name.lower()
+    timed = ['meter', 'smr', 'hurdle', 'yard', 'mile', 'medley']
+    return 'seconds' if any(word in name for word in timed) else 'inches'
+
+
+class EventNameTests(SimpleTestCase):
+
+    def test_known_names(self):
+        for value, expected in [
+                ('100 Meters', '100 Meters'),
+                ('100 Meter Semis', '100 Meters'),
+                ('1600m', '1600 Meters'),
+                ('DMR', 'Distance Medley Relay'),
+                (300, '300 Meters'),
+                (300.0, '300 Meters')]:
+            with self.subTest(value=value):
+                self.assertEqual(normalize_event_name(value), expected)
+
+    def test_case_and_whitespace(self):
+        for value in [' 100   meters ', '100 METERS', '100\tMeters']:
+            with self.subTest(value=value):
+                self.assertEqual(normalize_event_name(value), '100 Meters')
+        self.assertEqual(normalize_event_name('1600M'), '1600 Meters')
+
+    def test_misspellings_are_only_suggested(self):
+        # However close, a misspelling isn't taken for a known name
+        for value, suggestion in [
+                ('Shot Putt', 'Shot Put'),
+                ('3000 Meter', '3000 Meters'),
+                ('100 Metres', '100 Meters'),
+                ('Long Jmp', 'Long Jump')]:
+            with self.subTest(value=value):
+                self.assertIsNone(normalize_event_name(value))
+                self.assertEqual(suggest_event_name(value), suggestion)
+
+    def test_no_suggestion(self):
+        for value in ['xyzzy', 55, '']:
+            with self.subTest(value=value):
+                self.assertIsNone(normalize_event_name(value))
+                self.assertIsNone(suggest_event_name(value))
+
+    def test_numbers_must_match(self):
+        # 300 Meters isn't a misspelling of 3000 Meters
+        self.assertEqual(suggest_event_name('3000 Meter'), '3000 Meters')
+        self.assertEqual(suggest_event_name('300 Meter'), '300 Meters')
+
+    def test_units(self):
+        names = set(EVENT_DICT) | {canonical for canonical in EVENT_DICT.values() if canonical}
+        for name in sorted(names):
+            with self.subTest(name=name):
+                self.assertEqual(get_unit_for_event(name), words_unit(name))
@@ -0,0 +1,248 @@
+"""Importing the same sheet again only writes what changed, and an
+import that stopped part way carries on where it left off."""
+import os
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import importers
+from ..importers import continue_import, event_units, import_performances, read_rows
+from ..models import Event, ImportRun, PersonalBest, Result, Season, Team
+from ..validation import validate_performances
+
+HEADER = 'First Name,Last Name,Event,Performance,Meet,Date,FAT/HT/NA'
+
+# Ann ran the 100 twice at the opener, so her results are told apart by
+# the order they come in the sheet
+ROWS = [
+    'Ann,Diaz,100 Meters,13.1,Opener,4/2/2022,FAT',
+    'Ann,Diaz,100 Meters,12.9,Opener,4/2/2022,FAT',
+    'Bea,Hart,100 Meters,13.4,Opener,4/2/2022,HT',
+    'Bea,Hart,Shot Put,30-4,Opener,4/2/2022,NA',
+    'Cal,Ito,Shot Put,28-11,Opener,4/2/2022,NA',
+    'Ann,Diaz,100 Meters,12.8,Central,4/9/2022,FAT',
+    'Bea,Hart,100 Meters,13.2,Central,4/9/2022,FAT',
+]
+
+
+@override_settings(
+    STATS_QUEUE=True,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.team = Team.objects.create(name='Varsity')
+        cls.season = Season.objects.create(name='Outdoor 2022')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'results.csv')
+
+    def write_sheet(self, rows):
+        with open(self.path, 'w') as data_file:
+            data_file.write('\n'.join([HEADER] + rows) + '\n')
+
+    def import_sheet(self, rows, chunk_size=3):
+        self.write_sheet(rows)
+        with redirect_stdout(StringIO()):
+            return import_performances(
+                self.path, self.team, self.season, 'female', chunk_size=chunk_size)
+
+    def saved(self):
+        return dict(Result.objects.values_list('id', 'result'))
+
+    def test_reimport_skips_unchanged_rows(self):
+        run = self.import_sheet(ROWS)
+        self.assertEqual(run.results, len(ROWS))
+        saved = self.saved()
+
+        run = self.import_sheet(ROWS)
+        self.assertEqual(run.results, 0)
+        self.assertEqual(self.saved(), saved)
+
+    def test_reimport_updates_corrected_mark(self):
+        self.import_sheet(ROWS)
+        saved = self.saved()
+
+        # Ann's second 100 at the opener was a typo
+        rows = list(ROWS)
+        rows[1] = 'Ann,Diaz,100 Meters,12.7,Opener,4/2/2022,FAT'
+        run = self.import_sheet(rows)
+        self.assertEqual(run.results, 1)
+
+        corrected = Result.objects.get(result=12.7)
+        self.assertEqual(saved[corrected.id], 12.9)
+        saved[corrected.id] = 12.7
+        self.assertEqual(self.saved(), saved)
+
+    def test_second_file_keeps_results(self):
+        self.import_sheet(ROWS)
+        saved = self.saved()
+
+        # Another file with a result for the same meet, event and athlete
+        # doesn't take the place of the first file's
+        other = os.path.join(os.path.dirname(self.path), 'relays.csv')
+        with open(other, 'w') as data_file:
+            data_file.write(HEADER + '\nAnn,Diaz,100 Meters,12.6,Opener,4/2/2022,FAT\n')
+        with redirect_stdout(StringIO()):
+            run = import_performances(other, self.team, self.season, 'female', chunk_size=3)
+        self.assertEqual(run.results, 1)
+        new = Result.objects.get(result=12.6)
+        self.assertEqual(self.saved(), {**saved, new.id: 12.6})
+
+        # And each file still only writes its own changes
+        self.assertEqual(self.import_sheet(ROWS).results, 0)
+
+    def test_resume_after_interrupted_chunk(self):
+        write_results = importers.write_results
+        calls = []
+
+        def crash_on_second_chunk(results):
+            written = write_results(results)
+            calls.append(results)
+            if len(calls) == 2:
+                raise RuntimeError("Lost the connection")
+            return written
+
+        with mock.patch.object(importers, 'write_results', crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self.import_sheet(ROWS, chunk_size=1)
+
+        # The second chunk was rolled back with its progress
+        run = ImportRun.objects.get()
+        self.assertEqual(run.status, 'failed')
+        self.assertEqual(run.rows_done, 1)
+        self.assertEqual(Result.objects.count(), 1)
+
+        with redirect_stdout(StringIO()):
+            continue_import(run, self.path)
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'finished')
+        self.assertEqual((run.rows_done, run.results), (len(ROWS), len(ROWS)))
+        self.assertEqual(
+            sorted(Result.objects.values_list('result', flat=True)),
+            sorted([13.1, 12.9, 13.4, 364.0, 347.0, 12.8, 13.2]))
+
+        # Fingerprinted the same as an import that never stopped
+        self.assertEqual(self.import_sheet(ROWS).results, 0)
+
+    def test_resume_upload_needs_file(self):
+        run = ImportRun.objects.create(
+            name='results.csv', team=self.team, season=self.season,
+            gender='female', chunk_size=3, error='Lost the connection')
+        with self.assertRaisesMessage(CommandError, 'pass the file'):
+            call_command('import_spreadsheet', resume=run.id, stdout=StringIO())
+
+        self.write_sheet(ROWS)
+        with redirect_stdout(StringIO()):
+            call_command('import_spreadsheet', self.path, resume=run.id, stdout=StringIO())
+        self.assertEqual(Result.objects.count(), len(ROWS))
+
+    def test_validation_reads_marks_like_the_import(self):
+        # Added in the admin with the default unit, not the one its name implies
+        Event.objects.create(name='Pentathlon', unit='seconds')
+        rows = ROWS + ['Cal,Ito,Pentathlon,3:12.50,Central,4/9/2022,FAT']
+        self.write_sheet(rows)
+
+        report = validate_performances(self.path, self.season, event_units())
+        self.assertTrue(report.ok, str(report))
+        self.import_sheet(rows)
+        self.assertEqual(Result.objects.get(event__name='Pentathlon').result, 192.5)
+
+
+@override_settings(
+    STATS_QUEUE=True,
+    STATS_WORKERS=1,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ImportDirectoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.team = Team.objects.create(name='Varsity')
+        cls.season = Season.objects.create(name='Outdoor 2022')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        self.write('a.csv', ROWS[:3])
+        with open(os.path.join(self.directory, 'b.xlsx'), 'wb') as data_file:
+            data_file.write(b'not a workbook')
+        self.write('c.csv', ROWS[3:])
+
+    def write(self, name, rows):
+        with open(os.path.join(self.directory, name), 'w') as data_file:
+            data_file.write('\n'.join([HEADER] + rows) + '\n')
+
+    def import_directory(self):
+        output = StringIO()
+        with redirect_stdout(output):
+            call_command(
+                'import_directory', self.directory, team=self.team.id,
+                season=self.season.id, gender='female', workers=1)
+        return output.getvalue()
+
+    def test_bad_file_is_skipped(self):
+        output = self.import_directory()
+        self.assertIn('Skipping ' + os.path.join(self.directory, 'b.xlsx'), output)
+        self.assertEqual(Result.objects.count(), len(ROWS))
+        self.assertFalse(Result.objects.filter(personal_rank=-1).exists())
+
+        self.assertIn('0 rows processed', self.import_directory())
+
+    def test_stats_for_committed_sheets_when_a_write_fails(self):
+        write_sheet_rows = importers.write_sheet_rows
+
+        def fail_on_c(sheet_rows, context, source):
+            if source.endswith('c.csv'):
+                raise RuntimeError("Lost the connection")
+            return write_sheet_rows(sheet_rows, context, source)
+
+        with mock.patch.object(importers, 'write_sheet_rows', fail_on_c):
+            with self.assertRaises(RuntimeError):
+                self.import_directory()
+
+        # a.csv stays imported, with its stats
+        self.assertEqual(Result.objects.count(), 3)
+        self.assertFalse(Result.objects.filter(personal_rank=-1).exists())
+        self.assertTrue(PersonalBest.objects.exists())
+
+
+class ReadRowsTests(SimpleTestCase):
+
+    def test_short_rows_are_padded(self):
+        upload = SimpleUploadedFile(
+            'results.csv', f"{HEADER}\nAnn,Diaz,100 Meters,13.1,Opener\n".encode())
+        [row] = read_rows(upload)
+        self.assertEqual(row['performance'], '13.1')
+        self.assertIsNone(row['date'])
+        self.assertIsNone(row['fat/ht/na'])
+
+    def test_upload_read_in_chunks(self):
+        # A byte order mark, tabs, a name split across chunks part way
+        # through a character and no newline at the end
+        text = '\ufeff' + '\n'.join([
+            HEADER.replace(',', '\t'),
+            'Zoë\tNuñez\t100 Meters\t13.1\tOpener\t4/2/2022\tFAT',
+            'Ann\tDiaz\tShot Put\t30-4\tOpener\t4/2/2022\tNA',
+        ])
+        for chunk_size in [1, 3, 7, 64 * 1024]:
+            with self.subTest(chunk_size=chunk_size), \
+                    mock.patch.object(importers, 'UPLOAD_CHUNK_SIZE', chunk_size):
+                rows = list(read_rows(SimpleUploadedFile('results.tsv', text.encode())))
+                self.assertEqual(
+                    [(row['first name'], row['last name'], row['fat/ht/na']) for row in rows],
+                    [('Zoë', 'Nuñez', 'FAT'), ('Ann', 'Diaz', 'NA')])
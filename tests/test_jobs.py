@@ -0,0 +1,117 @@
+"""The stats job queue merges repeated jobs and hands each one out once."""
+import datetime
+from contextlib import redirect_stdout
+from io import StringIO
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..jobs import (
+    claim_stats_jobs, enqueue_athlete_stats, enqueue_stats,
+    release_stale_stats_jobs, run_stats_jobs)
+from ..models import Event, Meet, Result, Season, StatsJob, Team, User
+
+
+@override_settings(
+    STATS_QUEUE=True,
+    STATS_WORKERS=1,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class StatsJobTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sprint = Event.objects.create(name='100 Meters', unit='seconds')
+        cls.shot = Event.objects.create(name='Shot Put', unit='inches')
+        cls.athletes = [
+            User.objects.create(username=f'athlete{x}', gender='female')
+            for x in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def queued(self):
+        return set(StatsJob.objects.filter(
+            claimed=None).values_list('athlete_id', 'event_id'))
+
+    def test_repeated_jobs_merge(self):
+        athlete = self.athletes[0]
+        enqueue_stats({(athlete.id, self.sprint.id)})
+        enqueue_stats({(athlete.id, self.sprint.id), (athlete.id, self.shot.id)})
+        enqueue_stats({(athlete.id, self.sprint.id)})
+        self.assertEqual(self.queued(), {
+            (athlete.id, self.sprint.id), (athlete.id, self.shot.id)})
+        self.assertEqual(StatsJob.objects.count(), 2)
+
+    def test_all_events_job_covers_single_events(self):
+        athlete, other = self.athletes[:2]
+        enqueue_stats({(athlete.id, self.sprint.id), (other.id, self.sprint.id)})
+        enqueue_athlete_stats([athlete.id])
+        self.assertEqual(self.queued(), {(athlete.id, None), (other.id, self.sprint.id)})
+
+        enqueue_stats({(athlete.id, self.shot.id)})
+        enqueue_athlete_stats([athlete.id])
+        self.assertEqual(self.queued(), {(athlete.id, None), (other.id, self.sprint.id)})
+
+    def test_claimed_jobs_dont_absorb_new_ones(self):
+        # A worker may have read the results before the new change
+        athlete = self.athletes[0]
+        enqueue_athlete_stats([athlete.id])
+        [job] = claim_stats_jobs(10)
+        enqueue_stats({(athlete.id, self.sprint.id)})
+        self.assertEqual(self.queued(), {(athlete.id, self.sprint.id)})
+        self.assertEqual(StatsJob.objects.exclude(claimed=None).get(), job)
+
+    def test_claim_oldest_jobs_once(self):
+        for athlete in self.athletes:
+            enqueue_stats({(athlete.id, self.sprint.id)})
+
+        first = claim_stats_jobs(2)
+        self.assertEqual(
+            [job.athlete_id for job in first],
+            [athlete.id for athlete in self.athletes[:2]])
+        self.assertTrue(all(job.claimed for job in first))
+
+        [last] = claim_stats_jobs(2)
+        self.assertEqual(last.athlete_id, self.athletes[2].id)
+        self.assertEqual(claim_stats_jobs(2), [])
+
+    def test_release_stale_jobs(self):
+        athlete, other = self.athletes[:2]
+        enqueue_stats({(athlete.id, self.sprint.id), (other.id, None)})
+        claim_stats_jobs(10)
+        self.assertEqual(release_stale_stats_jobs(60), 0)
+        self.assertEqual(self.queued(), set())
+
+        # Queued again alongside a job added since, and merged with it
+        enqueue_stats({(athlete.id, self.sprint.id)})
+        StatsJob.objects.exclude(claimed=None).update(
+            claimed=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertEqual(release_stale_stats_jobs(60), 2)
+        self.assertEqual(self.queued(), {(athlete.id, self.sprint.id), (other.id, None)})
+        self.assertEqual(StatsJob.objects.count(), 2)
+
+    def test_run_stats_jobs(self):
+        team = Team.objects.create(name='Varsity')
+        meet = Meet.objects.create(
+            description='Opener', date=datetime.date(2022, 4, 2), team=team,
+            season=Season.objects.create(name='Outdoor 2022'))
+        athlete = self.athletes[0]
+        results = [
+            Result.objects.create(
+                athlete=athlete, event=self.sprint, meet=meet, result=mark, method='FAT')
+            for mark in [13.0, 12.5]
+        ]
+        enqueue_stats({(athlete.id, self.sprint.id)})
+
+        with redirect_stdout(StringIO()):
+            report = run_stats_jobs()
+        self.assertEqual(report.results, 2)
+        self.assertFalse(StatsJob.objects.exists())
+        self.assertEqual(
+            [result.personal_rank for result in Result.objects.filter(
+                id__in=[result.id for result in results]).order_by('id')],
+            [2, 1])
+        self.assertIsNone(run_stats_jobs())
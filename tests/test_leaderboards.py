@@ -0,0 +1,124 @@
+"""Leaderboards against a brute-force ranking of every result."""
+import datetime
+import itertools
+from contextlib import redirect_stdout
+from io import StringIO
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..achievements import feed_version
+from ..leaderboards import decode_cursor, leaderboard
+from ..models import Event, Meet, Result, Season, Team, User, fat_adjusted
+from ..stats import update_result_stats
+
+PAGE_SIZE = 3
+
+
+def reference(event, gender, season, team):
+    """(athlete id, adjusted value) best first, straight from the results."""
+    best = {}
+    for result in Result.objects.filter(event=event).select_related('athlete', 'meet'):
+        if season and result.meet.season_id != season.id:
+            continue
+        if team and result.meet.team_id != team.id:
+            continue
+        if gender and result.athlete.gender != gender:
+            continue
+        adjusted = fat_adjusted(result.result, result.method, event.unit)
+        if event.unit == 'inches':
+            key = (-adjusted, result.id)
+        else:
+            key = (adjusted, result.result, result.id)
+        if result.athlete_id not in best or key < best[result.athlete_id][0]:
+            best[result.athlete_id] = (key, adjusted)
+
+    sign = -1 if event.unit == 'inches' else 1
+    return sorted(
+        ((athlete_id, adjusted) for athlete_id, (key, adjusted) in best.items()),
+        key=lambda entry: sign * entry[1])
+
+
+@override_settings(
+    STATS_QUEUE=False,
+    STATS_WORKERS=1,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class LeaderboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seasons = [Season.objects.create(name=name) for name in ['Outdoor 2021', 'Outdoor 2022']]
+        cls.teams = [Team.objects.create(name=name) for name in ['Boys', 'Girls']]
+        cls.events = [
+            Event.objects.create(name='100 Meters', unit='seconds'),
+            Event.objects.create(name='1 Mile', unit='seconds'),
+            Event.objects.create(name='Shot Put', unit='inches'),
+        ]
+        cls.meets = meets = [
+            Meet.objects.create(
+                description=f'Meet {x}', date=datetime.date(2021 + x % 2, 4, 1 + x),
+                team=cls.teams[x // 2 % 2], season=cls.seasons[x % 2])
+            for x in range(6)
+        ]
+        athletes = [
+            User.objects.create(
+                username=f'athlete{x}', first_name=f'First{x}', last_name=f'Last{x}',
+                gender=['female', 'male'][x % 2])
+            for x in range(10)
+        ]
+        # Hand times, ties and athletes whose overall best came at another
+        # team's meet
+        Result.objects.bulk_create([
+            Result(
+                athlete=athlete, event=event, meet=meet,
+                result=base + (a * 7 + m * 3) % 6 * step,
+                method='Hand' if (a + m) % 3 == 0 else 'FAT')
+            for m, meet in enumerate(meets)
+            for a, athlete in enumerate(athletes)
+            if (a + m) % 4
+            for event, base, step in zip(cls.events, [12.0, 300.0, 360.0], [0.12, 2.0, 6.0])
+        ])
+        with redirect_stdout(StringIO()):
+            update_result_stats(set(Result.objects.values_list('athlete_id', 'event_id')))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_matches_reference(self):
+        filters = itertools.product(
+            self.events, [None, 'female', 'male'], [None] + self.seasons, [None] + self.teams)
+        for event, gender, season, team in filters:
+            with self.subTest(event=event.name, gender=gender, season=season, team=team):
+                entries = []
+                cursor = None
+                while True:
+                    page, cursor = leaderboard(
+                        event, gender, season, team, after=decode_cursor(cursor), size=PAGE_SIZE)
+                    entries += [(result.athlete_id, result.adjusted_value) for result in page]
+                    if not cursor:
+                        break
+
+                expected = reference(event, gender, season, team)
+                self.assertTrue(expected)
+                self.assertEqual([value for athlete_id, value in entries],
+                                 [value for athlete_id, value in expected])
+                self.assertEqual(sorted(entries), sorted(expected))
+
+    def test_new_result_refreshes_home_page(self):
+        home = self.client.get(reverse('index')).content.decode()
+        version = feed_version()
+        self.assertEqual(self.client.get(reverse('index')).content.decode(), home)
+
+        # A new personal best at the latest meet leads the feed
+        athlete = User.objects.create(username='new', gender='female')
+        result = Result.objects.create(
+            athlete=athlete, event=self.events[0], meet=self.meets[-1],
+            result=11.0, method='FAT')
+        with self.captureOnCommitCallbacks(execute=True), redirect_stdout(StringIO()):
+            update_result_stats({(athlete.id, result.event_id)})
+
+        self.assertNotEqual(feed_version(), version)
+        self.assertNotIn(result.formatted_result, home)
+        self.assertIn(result.formatted_result, self.client.get(reverse('index')).content.decode())
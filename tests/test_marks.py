@@ -0,0 +1,97 @@
+"""parse_mark and parse_marks against the formats found in real exports."""
+import datetime
+
+from django.test import SimpleTestCase
+
+from ..marks import is_no_mark, parse_mark, parse_mark_string, parse_marks, parse_marks_by_unit
+
+# Formats seen in real exports, with the mark each one should parse to
+MARK_CORPUS = [
+    # Times
+    ('12.34', 'seconds', 12.34),
+    (' 12.34 ', 'seconds', 12.34),
+    ('12.4h', 'seconds', 12.4),
+    ('10.85 (+1.2)', 'seconds', 10.85),
+    ('4:32.10', 'seconds', 272.1),
+    ('4:32.1', 'seconds', 272.1),
+    ('4:32', 'seconds', 272.0),
+    ('4:32,10', 'seconds', 272.1),
+    ('4:32..10', 'seconds', 272.1),
+    ('04:32.10', 'seconds', 272.1),
+    ('1:05:12.34', 'seconds', 3912.34),
+    ('2:00:00', 'seconds', 7200.0),
+    ('10:05:12.3', 'seconds', 36312.3),
+    (datetime.time(0, 4, 32, 100000), 'seconds', 272.1),
+    (datetime.datetime(1899, 12, 30, 0, 4, 32, 100000), 'seconds', 272.1),
+    (datetime.timedelta(minutes=65, seconds=12), 'seconds', 3912.0),
+    (58.2, 'seconds', 58.2),
+    (58, 'seconds', 58.0),
+    # Jumps and throws
+    ('14-11', 'inches', 179.0),
+    ('14-11.25', 'inches', 179.25),
+    ('14 - 11.5', 'inches', 179.5),
+    ('14-11½', 'inches', 179.5),
+    ('14-11 1/2', 'inches', 179.5),
+    ('14-11 3/4', 'inches', 179.75),
+    ('14\'11"', 'inches', 179.0),
+    ('14\' 11.5\'\'', 'inches', 179.5),
+    ('14ft 11in', 'inches', 179.0),
+    ('14ft. 11in.', 'inches', 179.0),
+    ('14\' 11"', 'inches', 179.0),
+    ('14-11¼', 'inches', 179.25),
+    ('14-11¾', 'inches', 179.75),
+    ('14\'', 'inches', 168.0),
+    ('5.20m', 'inches', 204.72),
+    ('5.2 M', 'inches', 204.72),
+    ('12m', 'inches', 472.44),
+    (179.5, 'inches', 179.5),
+    # No mark
+    ('NA', 'seconds', None),
+    ('N/A', 'seconds', None),
+    (' nm ', 'inches', None),
+    ('--', 'seconds', None),
+    ('SCR', 'seconds', None),
+    (True, 'seconds', None),
+    ('DNF', 'seconds', None),
+    ('dns', 'seconds', None),
+    ('DQ', 'seconds', None),
+    ('FOUL', 'inches', None),
+    ('NH', 'inches', None),
+    ('', 'inches', None),
+    (None, 'inches', None),
+    ('4:60.10', 'seconds', None),
+    ('1:60:00', 'seconds', None),
+    ('5.20m', 'seconds', None),
+    ('14-11', 'seconds', None),
+    ('4:32.10', 'inches', None),
+    ('fast', 'seconds', None),
+]
+
+
+class MarkParsingTests(SimpleTestCase):
+
+    def setUp(self):
+        parse_mark_string.cache_clear()
+
+    def test_parse_mark(self):
+        for value, unit, expected in MARK_CORPUS:
+            with self.subTest(value=value, unit=unit):
+                self.assertEqual(parse_mark(value, unit), expected)
+
+    def test_parse_marks(self):
+        # Twice, the second time from parse_mark_string's cache
+        for unit in ['seconds', 'inches']:
+            values = [value for value, value_unit, expected in MARK_CORPUS if value_unit == unit]
+            expected = [parse_mark(value, unit) for value in values]
+            self.assertEqual(parse_marks(values, unit), expected)
+            self.assertEqual(parse_marks(values, unit), expected)
+
+    def test_parse_marks_by_unit(self):
+        values, units, expected = zip(*MARK_CORPUS)
+        self.assertEqual(parse_marks_by_unit(values, units), list(expected))
+
+    def test_is_no_mark(self):
+        for value in ['', '  ', 'NA', 'dnf', ' Foul ', '--', None]:
+            self.assertTrue(is_no_mark(value), value)
+        for value in ['12.34', '4:60.10', 'fast', 0.0]:
+            self.assertFalse(is_no_mark(value), value)
@@ -0,0 +1,44 @@
+"""Compiled milestone tables against the linear scan they replaced."""
+from django.test import SimpleTestCase
+
+from ..milestones import EVENT_MILESTONES, get_milestone_table
+from ..models import Event, Result
+
+
+def linear_milestone_num(event, mark):
+    for x, milestone in enumerate(EVENT_MILESTONES.get(event.name, [])):
+        if mark >= milestone if event.unit == 'inches' else mark < milestone:
+            return x
+    return None
+
+
+class MilestoneTableTests(SimpleTestCase):
+
+    def test_milestone_num(self):
+        for name, unit in [
+                ('100 Meters', 'seconds'), ('1 Mile', 'seconds'),
+                ('Shot Put', 'inches'), ('High Jump', 'inches'),
+                # Listed the wrong way for the unit
+                ('Shot Put', 'seconds'), ('1500 Meters', 'seconds')]:
+            event = Event(name=name, unit=unit)
+            milestones = list(EVENT_MILESTONES[name])
+            # Every milestone, either side of it and past both ends
+            marks = [
+                value + offset
+                for value in milestones + [0, 10000]
+                for offset in [-0.01, 0, 0.01]
+            ]
+            for mark in marks:
+                with self.subTest(name=name, unit=unit, mark=mark):
+                    result = Result(event=event, result=mark)
+                    expected = linear_milestone_num(event, mark)
+                    self.assertEqual(result.milestone_num, expected)
+                    if expected is not None:
+                        self.assertEqual(
+                            result.get_milestone_value(expected), milestones[expected])
+
+            table = get_milestone_table(name, unit)
+            if table:
+                self.assertEqual(
+                    [milestone and milestone[0] for milestone in table.lookup_many(marks)],
+                    [linear_milestone_num(event, mark) for mark in marks])
@@ -0,0 +1,173 @@
+"""The qualifying index and requalifying results after levels change."""
+import datetime
+import os
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .. import qualifying
+from ..importers import import_qualifying
+from ..models import Event, Meet, MilestoneAward, QualifyingLevel, Result, Season, Team, User
+from ..qualifying import INDEX_VERSION_KEY, get_qualifying_index
+from ..stats import requalify, update_result_stats
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class QualifyingIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.season = Season.objects.create(name='Outdoor 2022')
+        cls.sprint = Event.objects.create(name='100 Meters', unit='seconds')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_version_published_on_commit(self):
+        get_qualifying_index()
+        version = cache.get(INDEX_VERSION_KEY)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            level = QualifyingLevel.objects.create(
+                description='States', event=self.sprint, season=self.season,
+                gender='female', value=13.0)
+            # Other processes keep the committed index until then
+            self.assertEqual(cache.get(INDEX_VERSION_KEY), version)
+            # This one sees its own change, without keeping it
+            self.assertEqual(get_qualifying_index().filter(event=self.sprint), [level])
+            self.assertIsNone(qualifying._index)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(cache.get(INDEX_VERSION_KEY), version)
+
+
+@override_settings(STATS_QUEUE=False, STATS_WORKERS=1, CACHES=LOCAL_CACHE)
+class RequalifyTests(TestCase):
+    """requalify only reads the results a change can affect, so each test
+    checks it leaves the same qualifications as recalculating everything."""
+
+    @classmethod
+    def setUpTestData(cls):
+        season = Season.objects.create(name='Outdoor 2022')
+        meet = Meet.objects.create(
+            description='Opener', date=datetime.date(2022, 4, 2),
+            team=Team.objects.create(name='Varsity'), season=season)
+        cls.sprint = Event.objects.create(name='100 Meters', unit='seconds')
+        cls.shot = Event.objects.create(name='Shot Put', unit='inches')
+        cls.states = QualifyingLevel.objects.create(
+            description='States', event=cls.sprint, season=season,
+            gender='female', value=13.5)
+        cls.sectionals = QualifyingLevel.objects.create(
+            description='Sectionals', event=cls.shot, season=season,
+            gender='female', value=360.0)
+
+        marks = {
+            # 13.2 hand is 13.44 and 13.3 hand is 13.54 once FAT adjusted
+            ('ann', 'female'): [(13.2, 'Hand'), (13.4, 'FAT'), (12.9, 'FAT'), (350.0, 'NA')],
+            ('bea', 'female'): [(13.3, 'Hand'), (13.6, 'FAT'), (13.05, 'Hand'), (362.5, 'NA')],
+            ('cal', 'male'): [(12.8, 'FAT'), (13.45, 'FAT'), (420.0, 'NA')],
+        }
+        for (username, gender), athlete_marks in marks.items():
+            athlete = User.objects.create(username=username, gender=gender)
+            for mark, method in athlete_marks:
+                Result.objects.create(
+                    athlete=athlete, meet=meet, result=mark, method=method,
+                    event=cls.shot if method == 'NA' else cls.sprint)
+        cls.groups = set(Result.objects.values_list('athlete_id', 'event_id'))
+        with redirect_stdout(StringIO()):
+            update_result_stats(cls.groups)
+
+    def setUp(self):
+        cache.clear()
+
+    def qualified(self):
+        return (
+            set(Result.qualifications.through.objects.values_list(
+                'result_id', 'qualifyinglevel_id')),
+            set(MilestoneAward.objects.filter(
+                kind=MilestoneAward.QUALIFIED
+            ).values_list('result_id', 'athlete_id', 'event_id', 'date', 'qualifying_level_id')),
+        )
+
+    def assertRequalified(self, changes):
+        before = self.qualified()
+        with redirect_stdout(StringIO()):
+            requalify(changes)
+        requalified = self.qualified()
+        with redirect_stdout(StringIO()):
+            update_result_stats(self.groups)
+        self.assertEqual(requalified, self.qualified())
+        self.assertNotEqual(requalified, before)
+
+    def change(self, level, **fields):
+        old_value = level.value
+        for name, value in fields.items():
+            setattr(level, name, value)
+        level.save()
+        return level, old_value
+
+    def test_level_loosened(self):
+        self.assertRequalified([self.change(self.states, value=13.6)])
+
+    def test_level_tightened_past_hand_time(self):
+        # 13.2 hand no longer meets it, though 13.2 is under 13.3
+        self.assertRequalified([self.change(self.states, value=13.3)])
+
+    def test_field_level_changed(self):
+        self.assertRequalified([
+            self.change(self.sectionals, value=348.0),
+            self.change(self.states, value=12.95),
+        ])
+
+    def test_level_moved(self):
+        level, old_value = self.change(self.states, gender='male')
+        self.assertRequalified([(level, None)])
+
+    def test_new_level(self):
+        level = QualifyingLevel.objects.create(
+            description='Conference', event=self.sprint,
+            season=self.states.season, gender='female', value=13.3)
+        self.assertRequalified([(level, None)])
+
+
+@override_settings(STATS_QUEUE=False, STATS_WORKERS=1, CACHES=LOCAL_CACHE)
+class ImportQualifyingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.season = Season.objects.create(name='Outdoor 2022')
+        cls.sprint = Event.objects.create(name='100 Meters', unit='seconds')
+
+    def setUp(self):
+        cache.clear()
+
+    def import_levels(self, rows):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'levels.csv')
+            with open(path, 'w') as data_file:
+                data_file.write('\n'.join(['Description,Gender,Event,Performance'] + rows) + '\n')
+            with redirect_stdout(StringIO()):
+                import_qualifying(path, self.season)
+
+    def test_existing_duplicate_level(self):
+        # Entered twice by hand, the import updates the older one
+        older, newer = [
+            QualifyingLevel.objects.create(
+                description='States', event=self.sprint, season=self.season,
+                gender='female', value=13.0)
+            for x in range(2)
+        ]
+        self.import_levels([
+            'States,female,100 Meters,12.8',
+            'Sectionals,female,100 Meters,13.4',
+        ])
+
+        values = dict(QualifyingLevel.objects.values_list('id', 'value'))
+        sectionals = QualifyingLevel.objects.get(description='Sectionals')
+        self.assertEqual(values, {older.id: 12.8, newer.id: 13.0, sectionals.id: 13.4})
@@ -0,0 +1,208 @@
+"""EXPLAIN QUERY PLAN checks for the queries behind the busy pages, imports
+and stats updates.
+
+Each test runs the real code path against a small seeded database,
+captures the SQL it sends and asks SQLite how it would run every
+statement. A plan that reads a whole table of results, awards or
+athletes, or the whole of one of its indexes, fails the test.
+"""
+import datetime
+import os
+import re
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.text import slugify
+
+from ..importers import import_performances
+from ..models import (
+    Event, Meet, MeetSummary, MilestoneAward, PersonalBest, QualifyingLevel,
+    RecentAchievement, Result, Season, Team, User)
+from ..stats import requalify, update_result_stats
+
+# Tables that grow with every meet, so reading one whole is never fine
+HOT_TABLES = {
+    model._meta.db_table for model in [
+        Result,
+        Result.qualifications.through,
+        MilestoneAward,
+        PersonalBest,
+        RecentAchievement,
+        MeetSummary,
+        Meet,
+        User,
+    ]
+}
+
+# "SCAN trackapp_result", "SCAN TABLE trackapp_result" before SQLite 3.36,
+# or a walk of a whole index, "SCAN trackapp_result USING INDEX ..."
+SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)( USING (?:COVERING )?INDEX)?")
+
+# Walking an index in order is fine for a page, it stops at the limit
+LIMIT = re.compile(r"\sLIMIT \d+(?: OFFSET \d+)?$")
+
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE')
+
+ATHLETES = 12
+MEETS = 4
+
+
+def full_scans(sql):
+    """The tables SQLite would read in full to run a statement."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        plan = [row[-1] for row in cursor.fetchall()]
+    paged = LIMIT.search(sql)
+    return [
+        match.group(1) for match in map(SCAN.match, plan)
+        if match and not (match.group(2) and paged)
+    ]
+
+
+@override_settings(
+    STATS_QUEUE=False,
+    STATS_WORKERS=1,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.season = Season.objects.create(name='Outdoor 2022')
+        cls.team = Team.objects.create(name='Varsity')
+        cls.sprint = Event.objects.create(name='100 Meters', unit='seconds')
+        cls.shot = Event.objects.create(name='Shot Put', unit='inches')
+        cls.level = QualifyingLevel.objects.create(
+            description='States', event=cls.sprint, season=cls.season,
+            gender='female', value=13.0)
+
+        cls.athletes = [
+            User.objects.create(
+                username=f'athlete{x}', first_name=f'First{x}',
+                last_name=f'Last{x}', gender=['female', 'male'][x % 2])
+            for x in range(ATHLETES)
+        ]
+        cls.meets = [
+            Meet.objects.create(
+                description=f'Meet {x}', date=datetime.date(2022, 4, 1 + x * 7),
+                team=cls.team, season=cls.season)
+            for x in range(MEETS)
+        ]
+        Result.objects.bulk_create([
+            Result(
+                athlete=athlete, event=event, meet=meet,
+                result=base + (a + m) % 5 * step, method='FAT')
+            for m, meet in enumerate(cls.meets)
+            for a, athlete in enumerate(cls.athletes)
+            for event, base, step in [(cls.sprint, 12.5, 0.2), (cls.shot, 360, 6)]
+        ])
+        with redirect_stdout(StringIO()):
+            update_result_stats(
+                set(Result.objects.values_list('athlete_id', 'event_id')))
+
+        cls.admin = User.objects.create(username='admin', is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNoFullScans(self, queries, allowed=()):
+        """Fail for any captured statement that reads a hot table whole,
+        other than the tables in allowed."""
+        tables = HOT_TABLES - {model._meta.db_table for model in allowed}
+        checked = 0
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(EXPLAINED):
+                continue
+            checked += 1
+            scanned = tables.intersection(full_scans(sql))
+            self.assertFalse(scanned, f"Full scan of {', '.join(sorted(scanned))}: {sql}")
+        self.assertTrue(checked, "No queries were captured")
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return queries
+
+    def test_home_page(self):
+        self.assertNoFullScans(self.get(reverse('index')))
+
+    def test_meet_page(self):
+        meet = self.meets[1]
+        self.assertNoFullScans(self.get(
+            reverse('meet', args=[meet.id, slugify(meet.description)])))
+
+    def test_profile(self):
+        self.client.force_login(self.admin)
+        self.assertNoFullScans(self.get(reverse('profile', args=[self.athletes[0].id])))
+
+    def test_event_leaderboard(self):
+        url = reverse('event', args=[self.sprint.id])
+        for query in ['', f'?gender=female&season={self.season.id}&team={self.team.id}']:
+            self.assertNoFullScans(self.get(url + query))
+
+    def test_user_list(self):
+        # Apart from the paginator counting every athlete
+        queries = self.get(reverse('user_list'))
+        self.assertNoFullScans(
+            [query for query in queries if 'COUNT(*)' not in query['sql']])
+
+    def test_stats(self):
+        with CaptureQueriesContext(connection) as queries:
+            update_result_stats({
+                (athlete.id, event.id)
+                for athlete in self.athletes[:3]
+                for event in [self.sprint, self.shot]
+            })
+        self.assertNoFullScans(queries)
+
+    def test_requalify(self):
+        old_value = self.level.value
+        self.level.value = 13.4
+        self.level.save()
+        with CaptureQueriesContext(connection) as queries:
+            requalify([(self.level, old_value), (self.level, None)])
+        self.assertNoFullScans(queries)
+
+    def test_delete_result(self):
+        self.client.force_login(self.admin)
+        result = Result.objects.filter(event=self.sprint).first()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('delete_result', args=[result.id]), {
+                'event': result.event_id,
+                'meet': result.meet_id,
+                'result': result.result,
+                'method': result.method,
+                'personal_rank': result.personal_rank,
+            })
+        self.assertFalse(Result.objects.filter(id=result.id).exists())
+        self.assertNoFullScans(queries)
+
+    def test_import(self):
+        lines = ['First Name,Last Name,Event,Performance,Meet,Date,FAT/HT/NA']
+        for x in range(ATHLETES + 2):
+            lines.append(f'First{x},Last{x},100 Meters,12.{x:02},Meet 1,4/8/2022,FAT')
+            lines.append(f'First{x},Last{x},Shot Put,30-{x % 12},New Meet,5/20/2022,NA')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.csv')
+            with open(path, 'w') as data_file:
+                data_file.write('\n'.join(lines) + '\n')
+
+            for chunk_size in [None, 10]:
+                with CaptureQueriesContext(connection) as queries, \
+                        redirect_stdout(StringIO()):
+                    import_performances(
+                        path, self.team, self.season, 'female', chunk_size=chunk_size)
+                # Every user is read once up front to match names in memory
+                self.assertNoFullScans(queries, allowed=[User])
+
+        self.assertEqual(
+            Result.objects.filter(meet__description='New Meet').count(), ATHLETES + 2)
@@ -0,0 +1,238 @@
+"""The stats engine checked against a plain, per result reference.
+
+The reference below works stats out the way the original
+calculate_result_stats did, one athlete, event and result at a time,
+with the engine's tie breaks. Every way of writing stats, from a full
+rebuild to a recount of a few groups, has to give the same output.
+"""
+import datetime
+import random
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .. import stats
+from ..jobs import enqueue_stats
+from ..milestones import EVENT_MILESTONES
+from ..models import (
+    Event, Meet, MilestoneAward, PersonalBest, QualifyingLevel, Result, Season,
+    Team, User)
+from ..stats import calculate_result_stats, recompute_stats, update_result_stats
+
+
+# Marks are drawn from a few values so hand and FAT times tie, as do
+# repeated marks: 12.5 hand is 12.74 FAT, and 5:00.0 hand is 5:00.14 FAT
+EVENTS = [
+    ('100 Meters', 'seconds', [11.9, 12.5, 12.74, 12.9, 13.0, 13.26, 14.1]),
+    ('1 Mile', 'seconds', [299.9, 300.0, 300.14, 305.5, 322.0, 361.0]),
+    ('Shot Put', 'inches', [298.0, 300.0, 330.5, 360.0, 361.25, 420.0]),
+    ('1500 Meters', 'seconds', [250.0, 255.5, 262.0]),
+]
+
+
+def adjusted(result):
+    if result.event.unit == 'inches' or result.method != 'Hand':
+        return result.result
+    return result.result + (0.14 if result.result > 180.0 else 0.24)
+
+
+def milestone(result):
+    """(milestone value, index) reached by a result, or None."""
+    for x, value in enumerate(EVENT_MILESTONES.get(result.event.name, [])):
+        if result.event.unit == 'inches':
+            if result.result >= value:
+                return value, x
+        elif result.result < value:
+            return value, x
+    return None
+
+
+def reference_stats():
+    """Ranks, awards, qualifications and personal bests for every result."""
+    groups = {}
+    for result in Result.objects.select_related('athlete', 'event', 'meet'):
+        groups.setdefault((result.athlete_id, result.event_id), []).append(result)
+    levels = list(QualifyingLevel.objects.all())
+
+    ranks, awards, qualifications, personal_bests = {}, set(), set(), set()
+    for (athlete_id, event_id), results in groups.items():
+        first = min(results, key=lambda result: (result.meet.date, result.id))
+        awards.add((first.id, MilestoneAward.FIRST, None, None))
+
+        if results[0].event.unit == 'inches':
+            ranked = sorted(results, key=lambda result: (-result.result, result.id))
+        else:
+            ranked = sorted(results, key=lambda result: (
+                adjusted(result), result.result, result.id))
+        for rank, result in enumerate(ranked):
+            ranks[result.id] = rank + 1
+        awards.add((ranked[0].id, MilestoneAward.PERSONAL_BEST, None, None))
+
+        personal_bests.add((athlete_id, event_id, None, ranked[0].id))
+        for season_id in {result.meet.season_id for result in results}:
+            best = next(
+                result for result in ranked if result.meet.season_id == season_id)
+            personal_bests.add((athlete_id, event_id, season_id, best.id))
+
+        for result in results:
+            for level in levels:
+                if (level.event_id, level.season_id, level.gender) != (
+                        event_id, result.meet.season_id, result.athlete.gender):
+                    continue
+                if result.event.unit == 'inches':
+                    met = result.result >= level.value
+                else:
+                    met = adjusted(result) <= level.value
+                if met:
+                    qualifications.add((result.id, level.id))
+                    awards.add((result.id, MilestoneAward.QUALIFIED, level.id, None))
+
+        best_milestone = None
+        for result in sorted(results, key=lambda result: (
+                result.meet.date, result.result, result.id)):
+            reached = milestone(result)
+            if reached and (best_milestone is None or reached[1] < best_milestone):
+                best_milestone = reached[1]
+                awards.add((result.id, MilestoneAward.BROKE, None, float(reached[0])))
+
+    return {
+        'ranks': ranks,
+        'awards': awards,
+        'qualifications': qualifications,
+        'personal_bests': personal_bests,
+    }
+
+
+def stored_stats():
+    """The same as reference_stats, read back from what was written."""
+    return {
+        'ranks': dict(Result.objects.values_list('id', 'personal_rank')),
+        'awards': set(MilestoneAward.objects.values_list(
+            'result_id', 'kind', 'qualifying_level_id', 'value')),
+        'qualifications': set(Result.qualifications.through.objects.values_list(
+            'result_id', 'qualifyinglevel_id')),
+        'personal_bests': set(PersonalBest.objects.values_list(
+            'athlete_id', 'event_id', 'season_id', 'result_id')),
+    }
+
+
+@override_settings(
+    STATS_QUEUE=False,
+    STATS_WORKERS=1,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class StatsEngineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(2022)
+        team = Team.objects.create(name='Varsity')
+        seasons = [Season.objects.create(name=f'Outdoor {year}') for year in [2021, 2022]]
+        cls.events = [
+            (Event.objects.create(name=name, unit=unit), marks)
+            for name, unit, marks in EVENTS
+        ]
+        # Two meets share each date, so same day results break ties too
+        cls.meets = [
+            Meet.objects.create(
+                description=f'Meet {x}', team=team, season=season,
+                date=datetime.date(2021 + s, 4, 1 + x // 2 * 7))
+            for s, season in enumerate(seasons)
+            for x in range(4)
+        ]
+        athletes = [
+            User.objects.create(
+                username=f'athlete{x}', gender=['female', 'male'][x % 2])
+            for x in range(6)
+        ]
+
+        for event, marks in cls.events:
+            for season in seasons:
+                for gender in ['female', 'male']:
+                    for value in rng.sample(marks, 2):
+                        QualifyingLevel.objects.create(
+                            description=f'Level {value}', event=event,
+                            season=season, gender=gender, value=value)
+
+        Result.objects.bulk_create([
+            Result(
+                athlete=athlete, event=event, meet=rng.choice(cls.meets),
+                result=rng.choice(marks),
+                method='NA' if event.unit == 'inches' else rng.choice(['FAT', 'Hand']))
+            for athlete in athletes
+            for event, marks in cls.events
+            for x in range(rng.randint(1, 7))
+        ])
+        cls.groups = set(Result.objects.values_list('athlete_id', 'event_id'))
+
+    def setUp(self):
+        cache.clear()
+
+    def assertMatchesReference(self):
+        stored = stored_stats()
+        expected = reference_stats()
+        for key in expected:
+            self.assertEqual(stored[key], expected[key], key)
+
+    def test_update_result_stats(self):
+        with redirect_stdout(StringIO()):
+            update_result_stats(self.groups)
+        self.assertMatchesReference()
+
+    def test_recompute_stats_on_worker_pool(self):
+        athlete_ids = {athlete_id for athlete_id, event_id in self.groups}
+        with redirect_stdout(StringIO()):
+            recompute_stats(
+                dict.fromkeys(athlete_ids), workers=2, chunk_size=2)
+        self.assertMatchesReference()
+
+    def test_calculate_result_stats(self):
+        for athlete in User.objects.all():
+            calculate_result_stats(athlete)
+        self.assertMatchesReference()
+
+    def test_rebuild_stats(self):
+        call_command('rebuild_stats', chunk_size=4, stdout=StringIO())
+        self.assertMatchesReference()
+
+    def test_recount_after_edits(self):
+        with redirect_stdout(StringIO()):
+            update_result_stats(self.groups)
+
+        # A new best, a mark moved to another meet and a deleted result
+        event, marks = self.events[0]
+        results = list(Result.objects.filter(event=event).order_by('id')[:3])
+        results[0].result = marks[0] - 1
+        results[0].save()
+        results[1].meet = self.meets[-1]
+        results[1].save()
+        results[2].delete()
+
+        with redirect_stdout(StringIO()):
+            update_result_stats({
+                (result.athlete_id, result.event_id) for result in results})
+        self.assertMatchesReference()
+
+    @override_settings(STATS_WORKERS=4)
+    def test_requests_compute_in_process(self):
+        # Enough athletes for several chunks
+        event, marks = self.events[0]
+        Result.objects.bulk_create([
+            Result(
+                athlete=User.objects.create(username=f'extra{x}'),
+                event=event, meet=self.meets[0], result=marks[x % len(marks)],
+                method='FAT')
+            for x in range(30)
+        ])
+        groups = set(Result.objects.values_list('athlete_id', 'event_id'))
+
+        with mock.patch.object(stats, 'ProcessPoolExecutor', side_effect=AssertionError):
+            for update in [enqueue_stats, update_result_stats]:
+                with self.subTest(update=update.__name__), redirect_stdout(StringIO()):
+                    Result.objects.update(personal_rank=-1)
+                    update(groups)
+                    self.assertMatchesReference()
@@ -0,0 +1,78 @@
+"""Checking uploads before they are imported never raises on what is in
+the file."""
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+from openpyxl import Workbook
+
+from .. import validation
+from ..validation import validate_performances
+
+HEADERS = ['First Name', 'Last Name', 'Event', 'Performance', 'Meet', 'Date', 'FAT/HT/NA']
+
+
+class ValidationTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write_csv(self, rows, headers=HEADERS):
+        path = os.path.join(self.directory, 'results.csv')
+        with open(path, 'w') as data_file:
+            data_file.write('\n'.join(','.join(row) for row in [headers] + rows) + '\n')
+        return path
+
+    def write_xlsx(self, rows):
+        path = os.path.join(self.directory, 'results.xlsx')
+        wb = Workbook()
+        for row in [HEADERS] + rows:
+            wb.active.append(row)
+        wb.save(path)
+        return path
+
+    def errors(self, path):
+        return [(error.row, error.message) for error in validate_performances(path).errors]
+
+    def test_short_first_row(self):
+        # The header line is complete, only the row is missing cells
+        rows = [
+            ['Ann', 'Diaz', '100 Meters', '13.1', 'Opener'],
+            ['Bea', 'Hart', '100 Meters', '13.4', 'Opener', '4/2/2022', 'FAT'],
+        ]
+        for path in [self.write_csv(rows), self.write_xlsx(rows)]:
+            with self.subTest(path=path):
+                self.assertEqual(self.errors(path), [(2, 'Unknown date None')])
+
+    def test_missing_columns(self):
+        path = self.write_csv(
+            [['Ann', 'Diaz', '100 Meters', '13.1']], headers=HEADERS[:4])
+        report = validate_performances(path)
+        self.assertEqual([(error.row, error.message) for error in report.errors], [(1, 'Missing columns')])
+        self.assertEqual(report.errors[0].value, 'meet or opponent or date, fat/ht/na or fat / hand')
+
+    def test_unreadable_row(self):
+        path = self.write_csv([
+            ['Ann', 'Diaz', '100 Meters', '13.1', 'Opener', '4/2/2022', 'FAT'],
+            ['Bea', 'Hart', '100 Meters', '13.4', 'Opener', '4/2/2022', 'FAT'],
+        ])
+        read_performance_row = validation.read_performance_row
+
+        def fail_for_bea(row, dates):
+            if row['first name'] == 'Bea':
+                raise KeyError('performance')
+            return read_performance_row(row, dates)
+
+        with mock.patch.object(validation, 'read_performance_row', fail_for_bea):
+            report = validate_performances(path)
+        self.assertEqual(
+            report.errors, [validation.RowError(3, "Can't read row", "KeyError: 'performance'")])
+
+    def test_not_a_spreadsheet(self):
+        path = os.path.join(self.directory, 'results.xlsx')
+        with open(path, 'wb') as data_file:
+            data_file.write(b'not a workbook')
+        self.assertEqual(self.errors(path), [(1, 'Not a spreadsheet')])
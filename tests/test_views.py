@@ -0,0 +1,144 @@
+"""Views that write results keep what is worked out from them usable
+while their stats are still queued."""
+import datetime
+from contextlib import redirect_stdout
+from io import StringIO
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..jobs import run_stats_jobs, stats_updating
+from ..models import (
+    Event, Meet, MeetSummary, MilestoneAward, PersonalBest, QualifyingLevel,
+    RecentAchievement, Result, Season, Team, User)
+from ..stats import requalify, update_result_stats
+
+
+@override_settings(
+    STATS_QUEUE=True,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ResultViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        season = Season.objects.create(name='Outdoor 2022')
+        team = Team.objects.create(name='Varsity')
+        cls.sprint = Event.objects.create(name='100 Meters', unit='seconds')
+        cls.mile = Event.objects.create(name='1600 Meters', unit='seconds')
+        cls.meet = Meet.objects.create(
+            description='Opener', date=datetime.date(2022, 4, 2), team=team, season=season)
+        cls.athlete = User.objects.create(
+            username='sam.lee', first_name='Sam', last_name='Lee')
+        cls.result = Result.objects.create(
+            athlete=cls.athlete, event=cls.sprint, meet=cls.meet, result=12.5, method='FAT')
+        with override_settings(STATS_QUEUE=False), redirect_stdout(StringIO()):
+            update_result_stats({(cls.athlete.id, cls.sprint.id)})
+        cls.admin = User.objects.create(username='admin', is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def post_result(self, view, instance, **values):
+        data = {
+            'event': instance.event_id,
+            'meet': instance.meet_id,
+            'result': instance.result,
+            'method': instance.method,
+        }
+        data.update(values)
+        with redirect_stdout(StringIO()):
+            return self.client.post(reverse(view, args=[instance.id]), data)
+
+    def test_edit_result_event(self):
+        # The result was the only one in its event at the meet, and its
+        # awards keep the old event until the queued stats run
+        response = self.post_result('edit_result', self.result, event=self.mile.id)
+        self.assertEqual(response.status_code, 302)
+
+        summaries = {
+            summary.event_id: summary.results
+            for summary in MeetSummary.objects.filter(meet=self.meet)
+        }
+        self.assertEqual(summaries, {None: 1, self.mile.id: 1})
+
+    def test_add_result_counts_on_meet(self):
+        with redirect_stdout(StringIO()):
+            response = self.client.post(reverse('add_result', args=[self.athlete.id]), {
+                'event': self.mile.id,
+                'meet': self.meet.id,
+                'result': 330.0,
+                'method': 'FAT',
+            })
+        self.assertEqual(response.status_code, 200)
+
+        summaries = {
+            summary.event_id: summary.results
+            for summary in MeetSummary.objects.filter(meet=self.meet)
+        }
+        self.assertEqual(summaries, {None: 2, self.sprint.id: 1, self.mile.id: 1})
+
+    def profile(self):
+        return self.client.get(reverse('profile', args=[self.athlete.id])).content.decode()
+
+    def test_edited_result_shows_on_profile(self):
+        self.assertIn('00:12.50', self.profile())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_result('edit_result', self.result, result=13.75)
+
+        html = self.profile()
+        self.assertIn('00:13.75', html)
+        self.assertNotIn('00:12.50', html)
+
+    def test_deleted_result_leaves_profile(self):
+        self.profile()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_result('delete_result', self.result)
+
+        self.assertNotIn(reverse('edit_result', args=[self.result.id]), self.profile())
+
+    def test_renamed_meet_and_level_show_on_profile(self):
+        level = QualifyingLevel.objects.create(
+            description='Sectionals', event=self.sprint, season=self.meet.season,
+            gender=self.athlete.gender, value=13.0)
+        with self.captureOnCommitCallbacks(execute=True), redirect_stdout(StringIO()):
+            requalify([(level, None)])
+        html = self.profile()
+        self.assertIn('Opener', html)
+        self.assertIn('Sectionals', html)
+
+        # Neither change touches the athlete's results or stats
+        with self.captureOnCommitCallbacks(execute=True):
+            self.meet.description = 'Season Opener'
+            self.meet.save()
+            level.description = 'Section 2'
+            level.save()
+
+        html = self.profile()
+        self.assertIn('Season Opener', html)
+        self.assertIn('Section 2', html)
+        self.assertNotIn('Sectionals', html)
+
+    def test_merge_meet_recalculates_stats(self):
+        season = Season.objects.create(name='Outdoor 2023')
+        survivor = Meet.objects.create(
+            description='Opener', date=datetime.date(2023, 4, 1),
+            team=self.meet.team, season=season)
+
+        with redirect_stdout(StringIO()):
+            response = self.client.post(
+                reverse('merge_meet', args=[self.meet.id]), {'meet': survivor.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(stats_updating([self.athlete.id]), {self.athlete.id})
+
+        with redirect_stdout(StringIO()):
+            run_stats_jobs(workers=1)
+        self.assertEqual(
+            set(MilestoneAward.objects.values_list('date', flat=True)), {survivor.date})
+        self.assertEqual(
+            set(RecentAchievement.objects.values_list('date', flat=True)), {survivor.date})
+        self.assertEqual(
+            set(PersonalBest.objects.values_list('season_id', 'date')),
+            {(None, survivor.date), (season.id, survivor.date)})
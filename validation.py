@@ -0,0 +1,107 @@
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from zipfile import BadZipFile
+
+from openpyxl.utils.exceptions import InvalidFileException
+
+from .dates import DateResolver
+from .events import get_unit_for_event
+from .importers import missing_headers, read_performance_row, read_rows
+from .marks import is_no_mark, parse_marks_by_unit
+
+# A problem with one row, row is the spreadsheet row number counting the
+# header as row 1
+RowError = namedtuple('RowError', ['row', 'message', 'value'])
+
+
+class ValidationReport(namedtuple('ValidationReport', ['name', 'rows', 'errors'])):
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __str__(self):
+        if self.ok:
+            return f"{self.name}: {self.rows} rows OK"
+        lines = [f"{self.name}: {len(self.errors)} errors in {self.rows} rows"]
+        for error in self.errors:
+            value = f" ({error.value})" if error.value is not None else ""
+            lines.append(f"  row {error.row}: {error.message}{value}")
+        return "\n".join(lines)
+
+
+def validate_performances(data_file, season=None, units=None):
+    """Check every row of a performance spreadsheet without touching the
+    database, returns a ValidationReport.
+
+    Finds the rows import_performances would stop on or skip: missing
+    names, unknown events, dates and meets that can't be read and marks
+    that don't parse. Rows marked DNF, FOUL and so on aren't errors, and
+    nothing wrong with the file is raised.
+    ``units`` maps the names of existing events to their unit, as
+    importers.event_units returns, so marks are read the way the import
+    will read them.
+    """
+    units = units or {}
+    name = getattr(data_file, 'name', None) or str(data_file)
+    dates = DateResolver(season)
+    errors = []
+    marks = []
+
+    count = 0
+    try:
+        for count, row in enumerate(read_rows(data_file), 1):
+            number = count + 1
+            if count == 1:
+                # Rows are read with a key for every header, even where
+                # cells are missing, so these are the header line's
+                missing = missing_headers(row)
+                if missing:
+                    errors.append(RowError(1, "Missing columns", ", ".join(missing)))
+                    break
+
+            try:
+                sheet_row = read_performance_row(row, dates)
+            except ValueError as e:
+                errors.append(RowError(number, str(e), None))
+                continue
+            except Exception as e:
+                errors.append(RowError(number, "Can't read row", f"{type(e).__name__}: {e}"))
+                continue
+            if sheet_row:
+                marks.append((number, sheet_row))
+    except (BadZipFile, InvalidFileException) as e:
+        return ValidationReport(name, 0, [RowError(1, "Not a spreadsheet", str(e))])
+    except Exception as e:
+        errors.append(RowError(count + 2, "Can't read file", f"{type(e).__name__}: {e}"))
+
+    values = parse_marks_by_unit(
+        [sheet_row.performance for number, sheet_row in marks],
+        [units.get(sheet_row.event_name) or get_unit_for_event(sheet_row.event_name)
+         for number, sheet_row in marks])
+    for (number, sheet_row), mark in zip(marks, values):
+        if mark is None and not is_no_mark(sheet_row.performance):
+            errors.append(RowError(number, "Bad performance", sheet_row.performance))
+
+    errors.sort(key=lambda error: error.row)
+    return ValidationReport(name, count, errors)
+
+
+def validate_files(data_files, season=None, units=None, workers=None):
+    """validate_performances for many files, one per worker process.
+
+    Returns the reports in the same order as data_files.
+    """
+    data_files = list(data_files)
+    if workers is None:
+        workers = min(len(data_files), multiprocessing.cpu_count())
+    if workers <= 1:
+        return [validate_performances(data_file, season, units) for data_file in data_files]
+
+    pool = ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context('fork'))
+    with pool:
+        return list(pool.map(
+            validate_performances, data_files, [season] * len(data_files),
+            [units] * len(data_files)))
@@ -1,44 +1,75 @@
 import json
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 from pprint import pprint
 
+from django.conf import settings
 from django.core.paginator import Paginator
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth import decorators
 from django.contrib.auth.decorators import login_required
 from django.db import IntegrityError, transaction
-from django.db.models import Q, Count, Min
+from django.db.models import Case, Count, F, FloatField, Min, Q, When
 from django.db.models.query import prefetch_related_objects
 from django.http import JsonResponse
 from django.shortcuts import (
     HttpResponse, HttpResponseRedirect, render, redirect, get_object_or_404)
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
 from django.utils.text import slugify
 from django.views.decorators.csrf import csrf_exempt
 from openpyxl import load_workbook
 
 from .models import *
-from .importers import import_performances, import_qualifying
+from .achievements import feed_version, bump_feed_version, recent_achievements
+from .importers import event_units, import_performances, import_qualifying
+from .jobs import enqueue_athlete_stats, enqueue_stats, stats_updating
+from .leaderboards import decode_cursor, leaderboard
+from .profiles import AthleteProfile
+from .qualifying import get_qualifying_index
+from .stats import requalify, stats_groups
+from .summaries import meet_summary, update_meet_summaries
+from .validation import validate_performances
 from .forms import *
-from .event_dict import EVENT_DICT
+from .events import normalize_event_name, suggest_event_name
 
 
 
-def index(request):
-    meets = Meet.objects.all().order_by("-date")[:10]
+def award_counts(awards):
+    """Number of milestone awards of each kind, in one grouped query."""
+    counts = dict.fromkeys(
+        (kind for kind, label in MilestoneAward.KIND_CHOICES), 0)
+    counts.update(awards.order_by().values_list(
+        'kind').annotate(count=Count('id')))
+    return counts
 
-    latest_prs = Result.objects.filter(
-        personal_rank=1,
-    ).order_by(
-        '-meet__date'
-    )[:20]
 
+def index(request):
+    meets = Meet.objects.select_related('team').order_by("-date")[:10]
+
+    # Awards are dated by their meet, so the week is a range on (kind, date)
+    today = date.today()
+    def week_counts():
+        counts = award_counts(MilestoneAward.objects.filter(
+            kind__in=[MilestoneAward.PERSONAL_BEST, MilestoneAward.QUALIFIED, MilestoneAward.BROKE],
+            date__range=(today - timedelta(days=6), today)))
+        return {
+            'prs': counts[MilestoneAward.PERSONAL_BEST],
+            'qualifications': counts[MilestoneAward.QUALIFIED],
+            'milestones': counts[MilestoneAward.BROKE],
+        }
+
+    # Everything is read lazily, so a page served from the cached fragment
+    # only looks up the feed version
 
     return render(request, "index.html", {
         "meets": meets,
-        "latest_prs": latest_prs,
+        "achievements": recent_achievements(),
+        "week": SimpleLazyObject(week_counts),
+        "feed_version": feed_version(),
+        "today": today,
+        "home_cache_seconds": settings.HOME_CACHE_SECONDS,
     })
 
 
@@ -50,11 +81,24 @@ def load_spreadsheet(request):
         if not upload_form.is_valid():
             raise Exception("Error")
 
+        # Check the whole file before writing anything
+        report = validate_performances(
+            upload_form.cleaned_data['file'],
+            season=upload_form.cleaned_data['season'],
+            units=event_units())
+        if not report.ok or upload_form.cleaned_data['dry_run']:
+            return render(request, "load_spreadsheet.html", {
+                'form': upload_form,
+                'report': report,
+            })
+
+        # Committed in chunks so the site stays usable during a big import
         import_performances(
             upload_form.cleaned_data['file'], 
             team=upload_form.cleaned_data['team'],
             season=upload_form.cleaned_data['season'],
-            gender=upload_form.cleaned_data['gender']
+            gender=upload_form.cleaned_data['gender'],
+            chunk_size=settings.IMPORT_CHUNK_SIZE,
         )
         return redirect('load_spreadsheet')       
     else:
@@ -136,32 +180,14 @@ def user_list(request):
 def profile(request, user_id):
 
     user = User.objects.get(id=user_id)
-    results = Result.objects.filter(
-        athlete=user
-    ).order_by(
-        'meet__date'
-    ).prefetch_related(
-        'event',
-        'meet',
-        'meet__season',
-        'qualifications'
-    )
-    goals = user.goals.all()
-
-    results_by_event = {}
-    for result in results:
-        if result.event in results_by_event:
-            results_by_event[result.event].append(result)
-        else:
-            results_by_event[result.event] = [result]
-
-    results_by_event = sorted(results_by_event.items(), key=lambda e: e[0].name)
+    goals = user.goals.select_related('event', 'meet', 'season')
 
     return render(request, "profile.html", {
         'user': user,
-        'results':results,
-        'results_by_event':results_by_event,
+        'profile': AthleteProfile(user),
+        'profile_cache_seconds': settings.PROFILE_CACHE_SECONDS,
         'goals': goals,
+        'stats_updating': bool(stats_updating([user.id])),
         })
 
 def meets(request):
@@ -173,32 +199,40 @@ def meet(request, meet_id, name):
 
     
     meet = get_object_or_404(Meet, id=meet_id)
+    event_summaries = meet.summaries.exclude(
+        event=None
+    ).select_related(
+        'event'
+    ).order_by(
+        'event__name', 'event_id'
+    )
+
+    # Grouped by event in the database, best mark first
     results = Result.objects.filter(
         meet=meet
-    ).order_by(
-        'result'
-    ).prefetch_related(
+    ).select_related(
         'event',
         'athlete',
-        'qualifications'
+    ).prefetch_related(
+        'qualifications',
+        MILESTONE_AWARDS_PREFETCH,
+    ).order_by(
+        'event__name',
+        'event_id',
+        Case(
+            When(event__unit='inches', then=F('result') * -1),
+            default=F('result'),
+            output_field=FloatField()),
+        'id',
     )
 
-    new_prs = results.filter(personal_rank=1).count()
-    qualifications = Result.qualifications.through.objects.filter(result__in=results).count()
-
-    results_by_event = {}
-    athletes = set()
-    for result in results:
-        athletes.add(result.athlete)
-        results_by_event.setdefault(result.event, []).append(result)
-    
     return render(request, "meet.html", {
         'meet': meet,
-        'athletes': athletes,
+        'summary': meet_summary(meet),
+        'event_summaries': event_summaries,
         'results': results,
-        'results_by_event': results_by_event,
-        'new_prs': new_prs,
-        'qualifications': qualifications,
+        'stats_updating': bool(stats_updating(
+            results.values('athlete_id'))),
         })
 
 def events(request):
@@ -216,24 +250,33 @@ def events(request):
 def event(request, event_id):
 
     event = Event.objects.get(id=event_id)
-    results_qs = Result.objects.filter(
-        event=event
-    ).order_by(
-        'result'
-    ).prefetch_related(
-        'athlete'
+
+    form = LeaderboardFilterForm(request.GET)
+    form.is_valid()
+
+    results, next_cursor = leaderboard(
+        event,
+        gender=form.cleaned_data.get('gender'),
+        season=form.cleaned_data.get('season'),
+        team=form.cleaned_data.get('team'),
+        after=decode_cursor(request.GET.get('after')),
     )
 
-    found = set()
-    results = []
-    for r in results_qs:
-        if not r.athlete in found:
-            found.add(r.athlete)
-            results.append(r)
+    # The same filters for the first and next pages
+    query = request.GET.copy()
+    query.pop('after', None)
+    first_query = query.urlencode() if 'after' in request.GET else None
+    next_query = None
+    if next_cursor:
+        query['after'] = next_cursor
+        next_query = query.urlencode()
 
     return render(request, "event.html", {
         'event':event,
-        'results':results
+        'results':results,
+        'form': form,
+        'next_query': next_query,
+        'first_query': first_query,
         })
 
 @login_required
@@ -245,12 +288,18 @@ def merge_event(request, event_id):
         form = MergeEventForm(request.POST)
         if form.is_valid():
             survivor = form.cleaned_data['event']
+            athlete_ids = set(event.results.values_list('athlete_id', flat=True))
             event.results.all().update(event=survivor)
             event.delete()
+            enqueue_stats({
+                (athlete_id, survivor.id) for athlete_id in athlete_ids})
             print(f"Merging {event.id} into {survivor.id}")
             return redirect('event', survivor.id)
     else:
-        form = MergeEventForm()
+        # Start with the event this one's name normalizes to, if it exists
+        name = normalize_event_name(event.name) or suggest_event_name(event.name)
+        survivor = Event.objects.filter(name=name).exclude(id=event.id).first()
+        form = MergeEventForm(initial={'event': survivor})
 
     return render(request, "merge_event.html", {
         "form": form,
@@ -272,6 +321,8 @@ def add_result(request, user_id):
             form.save(commit=False)
             form.instance.athlete=user
             form.instance.save()
+            update_meet_summaries([form.instance.meet_id])
+            enqueue_stats(stats_groups([form.instance]))
     else:
         form = ResultForm()
 
@@ -291,10 +342,17 @@ def edit_result(request, result_id):
     results = Result.objects.filter(athlete=user)
 
     if request.method=="POST":
+        # The event may change, so the old group needs recalculating too
+        groups = stats_groups([result])
+        old_meet_id = result.meet_id
         form = ResultForm(request.POST, instance=result)
         if form.is_valid():
             form.save()
-            calculate_result_stats(user)
+            if result.meet_id != old_meet_id:
+                RecentAchievement.objects.filter(
+                    result=result).update(date=result.meet.date)
+            update_meet_summaries({old_meet_id, result.meet_id})
+            enqueue_stats(groups | stats_groups([result]))
             messages.success(request, 'Result successfully updated.') 
             return redirect("profile", user.id)
     else:
@@ -317,7 +375,10 @@ def delete_result(request, result_id):
     if request.method=="POST":
         form = ResultForm(request.POST, instance=result)
         if form.is_valid():
+            groups = stats_groups([result])
             result.delete()
+            update_meet_summaries([result.meet_id])
+            enqueue_stats(groups)
         return redirect("profile", user.id)
     else:
         form = ResultForm(instance=result)
@@ -363,7 +424,7 @@ def merge_athlete(request, user_id):
             user.results.all().update(athlete=survivor)
             user.delete()
             print(f"Merging {user.id} into {survivor.id}")
-            survivor.calculate_result_stats()
+            enqueue_athlete_stats([survivor.id])
             return redirect('profile', survivor.id)
     else:
         form = MergeAthleteForm()
@@ -423,8 +484,16 @@ def merge_meet(request, meet_id):
         form = MergeMeetForm(request.POST, meet=meet)
         if form.is_valid():
             survivor = form.cleaned_data['meet']
+            # The survivor's date and season can differ, so everything
+            # worked out from them is recalculated
+            groups = stats_groups(meet.results.all())
+            RecentAchievement.objects.filter(
+                result__meet=meet).update(date=survivor.date)
             meet.results.all().update(meet=survivor)
             meet.delete()
+            update_meet_summaries([survivor.id])
+            enqueue_stats(groups)
+            bump_feed_version()
             print(f"Merging {meet.description} into {survivor.description}")
             return redirect('meet', survivor.id, slugify(survivor.description))
     else:
@@ -539,26 +608,15 @@ def debug_page(request):
 
 
 def qualifying_levels(request):
-    qualifying_levels = QualifyingLevel.objects.all().prefetch_related(
-        'event', 'season'
-    ).order_by(
-        "description", "gender"
-    )
-
     form = QualifyingFilterForm(request.GET)
     form.is_valid()
 
-    event = form.cleaned_data.get('event')
-    if event:
-        qualifying_levels = qualifying_levels.filter(event=event)
-
-    season = form.cleaned_data.get('season')
-    if season:
-        qualifying_levels = qualifying_levels.filter(season=season)
-
-    gender = form.cleaned_data.get('gender')
-    if gender:
-        qualifying_levels = qualifying_levels.filter(gender=gender)
+    qualifying_levels = get_qualifying_index().filter(
+        event=form.cleaned_data.get('event'),
+        season=form.cleaned_data.get('season'),
+        gender=form.cleaned_data.get('gender'),
+    )
+    qualifying_levels.sort(key=lambda ql: (ql.description, ql.gender))
 
     return render(request, "qualifying_levels.html", {
         "qualifying_levels":qualifying_levels,
@@ -567,15 +625,26 @@ def qualifying_levels(request):
 
 @login_required
 def edit_qualifying_level(request, qualifying_level_id=None):
+    old_level = None
     if qualifying_level_id:
         qualifying_level = get_object_or_404(QualifyingLevel, id=qualifying_level_id)
+        old_level = (qualifying_level.event_id, qualifying_level.season_id,
+                     qualifying_level.gender, qualifying_level.value)
     else:
         qualifying_level = QualifyingLevel()
 
     if request.method=="POST":
         form = QualifyingLevelForm(request.POST, instance=qualifying_level)
         if form.is_valid():
-            form.save()
+            qualifying_level = form.save()
+
+            # A level moved to another event, season or gender is
+            # requalified from scratch
+            old_value = None
+            if old_level and old_level[:3] == (qualifying_level.event_id,
+                    qualifying_level.season_id, qualifying_level.gender):
+                old_value = old_level[3]
+            requalify([(qualifying_level, old_value)])
             return redirect('qualifying_levels')
         else:
             print(form.errors)